@@ -0,0 +1,164 @@
+"""
+Historical backfill of donations from the ledger.
+
+    python listener.py backfill [--from LEDGER] [--to LEDGER] [--chunk N]
+                                [--concurrency N] [--address ADDR ...]
+
+The ledger range of each watched address is split into chunks of --chunk
+ledgers, recorded in backfill_progress, and drained by a pool of async
+workers, each following AccountTx markers to the end of its chunk and
+bulk-inserting the donations it finds. Inserts are idempotent and finished
+chunks are marked done, so an interrupted run picks up where it left off
+when started again with the same range and chunk size.
+"""
+import os, time, asyncio, argparse
+from xrpl.asyncio.clients import AsyncJsonRpcClient
+from xrpl.models.requests import AccountTx, Ledger
+import db
+from listener import get_watch_addresses, donation_memos, insert_many_async, tx_ledger_index
+
+XRPL_RPC = os.getenv("XRPL_RPC", "https://s.altnet.rippletest.net:51234")
+CHUNK_LEDGERS = int(os.getenv("BACKFILL_CHUNK_LEDGERS", "50000"))
+CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "8"))
+RETRIES = int(os.getenv("BACKFILL_RETRIES", "5"))
+REPORT_INTERVAL = float(os.getenv("BACKFILL_REPORT_INTERVAL", "5"))
+
+class Progress:
+    def __init__(self, chunks: int):
+        self.chunks = chunks
+        self.done = 0
+        self.failed = 0
+        self.scanned = 0
+        self.donations = 0
+        self.started = time.monotonic()
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        print(f"Backfill: {self.done}/{self.chunks} chunks, {self.failed} failed, "
+              f"{self.scanned} txs scanned ({self.scanned / elapsed:.0f}/s), "
+              f"{self.donations} donations recorded, {elapsed:.0f}s elapsed")
+
+async def validated_ledger(client) -> int:
+    response = await client.request(Ledger(ledger_index="validated"))
+    return int(response.result["ledger_index"])
+
+async def first_ledger(client, address: str):
+    """Ledger of the address's oldest transaction, or None if it has none"""
+    response = await client.request(AccountTx(account=address, forward=True, limit=1))
+    txs = response.result.get("transactions", []) if response.is_successful() else []
+    return tx_ledger_index(txs[0]) if txs else None
+
+async def build_chunks(client, addresses, from_ledger, to_ledger, chunk_ledgers=CHUNK_LEDGERS):
+    """(address, ledger_min, ledger_max) work units covering each address's range"""
+    chunks = []
+    for address in addresses:
+        start = from_ledger or await first_ledger(client, address)
+        if start is None:
+            print(f"No transactions for {address}, skipping")
+            continue
+        for low in range(start, to_ledger + 1, chunk_ledgers):
+            chunks.append((address, low, min(low + chunk_ledgers - 1, to_ledger)))
+    return chunks
+
+def plan(chunks):
+    """Record the chunks and return those not finished by an earlier run"""
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO backfill_progress (address, ledger_min, ledger_max) VALUES (%s, %s, %s) "
+            "ON CONFLICT DO NOTHING",
+            chunks
+        )
+        cur.execute(
+            "SELECT address, ledger_min, ledger_max FROM backfill_progress "
+            "WHERE done_at IS NULL AND (address, ledger_min, ledger_max) IN "
+            "(SELECT * FROM unnest(%s::text[], %s::bigint[], %s::bigint[])) "
+            "ORDER BY ledger_min, address",
+            ([c[0] for c in chunks], [c[1] for c in chunks], [c[2] for c in chunks])
+        )
+        return cur.fetchall()
+
+def _mark_done(conn, address, ledger_min, ledger_max):
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE backfill_progress SET done_at = now() "
+            "WHERE address = %s AND ledger_min = %s AND ledger_max = %s",
+            (address, ledger_min, ledger_max)
+        )
+
+async def backfill_chunk(client, address, ledger_min, ledger_max, progress):
+    marker = None
+    while True:
+        response = await client.request(AccountTx(
+            account=address, ledger_index_min=ledger_min, ledger_index_max=ledger_max,
+            forward=True, marker=marker
+        ))
+        if not response.is_successful():
+            raise RuntimeError(f"AccountTx failed: {response.result}")
+        txs = response.result["transactions"]
+        rows = donation_memos(txs)
+        await insert_many_async(rows)
+        progress.scanned += len(txs)
+        progress.donations += len(rows)
+        marker = response.result.get("marker")
+        if marker is None:
+            break
+    await db.get_async_pool().run(_mark_done, address, ledger_min, ledger_max)
+
+async def _worker(client, queue, progress):
+    while True:
+        try:
+            chunk = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        for attempt in range(1, RETRIES + 1):
+            try:
+                await backfill_chunk(client, *chunk, progress)
+                progress.done += 1
+                break
+            except Exception as e:
+                if attempt == RETRIES:
+                    progress.failed += 1
+                    print(f"Giving up on {chunk[0]} ledgers {chunk[1]}-{chunk[2]} for this run: {e}")
+                else:
+                    await asyncio.sleep(min(60, 2 ** attempt))
+
+async def _reporter(progress):
+    while True:
+        await asyncio.sleep(REPORT_INTERVAL)
+        progress.report()
+
+async def backfill(addresses, from_ledger=None, to_ledger=None,
+                   chunk_ledgers=CHUNK_LEDGERS, concurrency=CONCURRENCY):
+    client = AsyncJsonRpcClient(XRPL_RPC)
+    to_ledger = to_ledger or await validated_ledger(client)
+    chunks = await build_chunks(client, addresses, from_ledger, to_ledger, chunk_ledgers)
+    pending = await asyncio.to_thread(plan, chunks)
+    print(f"Backfilling {len(addresses)} addresses up to ledger {to_ledger}: "
+          f"{len(pending)} of {len(chunks)} chunks left")
+
+    queue = asyncio.Queue()
+    for chunk in pending:
+        queue.put_nowait(chunk)
+    progress = Progress(len(pending))
+    reporter = asyncio.create_task(_reporter(progress))
+    try:
+        await asyncio.gather(*(_worker(client, queue, progress) for _ in range(concurrency)))
+    finally:
+        reporter.cancel()
+    progress.report()
+    return progress
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="listener.py backfill", description="Rebuild donations from ledger history")
+    parser.add_argument("--from", dest="from_ledger", type=int, help="first ledger (default: oldest tx per address)")
+    parser.add_argument("--to", dest="to_ledger", type=int, help="last ledger (default: latest validated)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_LEDGERS, help="ledgers per work unit")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--address", action="append", help="address to backfill (default: all watched)")
+    args = parser.parse_args(argv)
+    addresses = args.address or list(get_watch_addresses())
+    if not addresses:
+        print("No addresses to backfill")
+        return 1
+    progress = asyncio.run(backfill(addresses, args.from_ledger, args.to_ledger, args.chunk, args.concurrency))
+    return 1 if progress.failed else 0
@@ -0,0 +1,131 @@
+"""
+XRP and trustline balances of the platform's wallets.
+
+One refresh reads account_info and every AccountLines page (following
+markers) for all watched accounts concurrently, pinned to a single
+validated ledger so the snapshot is consistent. BalanceCache keeps the
+last snapshot: for BALANCES_CACHE_TTL seconds it is served as is, after
+that the latest validated ledger index is checked and accounts are only
+re-read once a new ledger has closed. Concurrent callers share one
+in-flight refresh instead of each querying the server.
+"""
+import os, time, asyncio
+from decimal import Decimal
+from xrpl.asyncio.clients import AsyncJsonRpcClient
+from xrpl.asyncio.ledger import get_latest_validated_ledger_sequence
+from xrpl.models.requests import AccountInfo, AccountLines
+from xrpl.utils import drops_to_xrp
+import wallets, wallet_utils
+
+XRPL_RPC = os.getenv("XRPL_RPC", "https://s.altnet.rippletest.net:51234")
+RLUSD_ISSUER = os.getenv("RLUSD_ISSUER", "rQhWct2fv4Vc4KRjRgMrxa8xPN9Zx9iLKV")
+RLUSD_HEX = "524C555344000000000000000000000000000000"
+BALANCES_CACHE_TTL = float(os.getenv("BALANCES_CACHE_TTL", "2"))
+BALANCES_CONCURRENCY = int(os.getenv("BALANCES_CONCURRENCY", "20"))
+ACCOUNT_LINES_PAGE = 400
+
+def watched_accounts() -> dict:
+    """
+    {label: address} for the charity wallets (configured address, else the
+    one derived from the seed), the platform wallet and any wallets in the
+    provisioning registry
+    """
+    accounts = {}
+    for charity in wallets.CHARITY_SEED_VARS:
+        address = os.getenv(f"{charity}_WALLET_ADDRESS")
+        if not address:
+            wallet = wallets.charity_wallet(charity)
+            address = wallet.classic_address if wallet else None
+        if address:
+            accounts[charity] = address
+    platform = wallets.platform_wallet()
+    if platform is not None:
+        accounts["PLATFORM"] = platform.classic_address
+    for name, entry in wallet_utils.load_registry().items():
+        accounts.setdefault(name, entry["address"])
+    return accounts
+
+async def _account_lines(client, address: str, ledger_index: int):
+    lines, marker = [], None
+    while True:
+        response = await client.request(AccountLines(
+            account=address, ledger_index=ledger_index, limit=ACCOUNT_LINES_PAGE, marker=marker
+        ))
+        if not response.is_successful():
+            raise RuntimeError(f"AccountLines failed: {response.result.get('error', response.result)}")
+        lines += response.result.get("lines", [])
+        marker = response.result.get("marker")
+        if marker is None:
+            return lines
+
+async def fetch_account(client, address: str, ledger_index: int) -> dict:
+    info = await client.request(AccountInfo(account=address, ledger_index=ledger_index))
+    if not info.is_successful():
+        return {"address": address, "error": info.result.get("error", "account_info failed")}
+    lines = await _account_lines(client, address, ledger_index)
+    rlusd = sum((Decimal(line["balance"]) for line in lines
+                 if line["currency"] in (RLUSD_HEX, "RLUSD") and line["account"] == RLUSD_ISSUER),
+                Decimal(0))
+    return {
+        "address": address,
+        "xrp": str(drops_to_xrp(info.result["account_data"]["Balance"])),
+        "rlusd": str(rlusd),
+        "lines": [{"currency": line["currency"], "issuer": line["account"],
+                   "balance": line["balance"], "limit": line["limit"]} for line in lines],
+    }
+
+async def fetch_balances(accounts: dict, client=None, ledger_index=None,
+                         concurrency: int = BALANCES_CONCURRENCY) -> dict:
+    """{"ledger_index", "accounts": {label: balances}} at one validated ledger"""
+    client = client or AsyncJsonRpcClient(XRPL_RPC)
+    if ledger_index is None:
+        ledger_index = await get_latest_validated_ledger_sequence(client)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(address):
+        async with semaphore:
+            try:
+                return await fetch_account(client, address, ledger_index)
+            except Exception as e:
+                return {"address": address, "error": str(e)}
+
+    results = await asyncio.gather(*(one(address) for address in accounts.values()))
+    return {"ledger_index": ledger_index, "accounts": dict(zip(accounts, results))}
+
+class BalanceCache:
+    def __init__(self, ttl: float = BALANCES_CACHE_TTL):
+        self.ttl = ttl
+        self.client = AsyncJsonRpcClient(XRPL_RPC)
+        self._lock = None
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def _fresh(self) -> bool:
+        return self._snapshot is not None and time.monotonic() - self._checked_at < self.ttl
+
+    async def get(self) -> dict:
+        if self._fresh():
+            return self._snapshot
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Whoever held the lock may have just refreshed
+            if self._fresh():
+                return self._snapshot
+            # Reads the registry file and may derive keys: keep it off the loop
+            accounts = await asyncio.to_thread(watched_accounts)
+            ledger_index = await get_latest_validated_ledger_sequence(self.client)
+            snapshot = self._snapshot
+            if (snapshot is None or snapshot["ledger_index"] != ledger_index
+                    or {k: v["address"] for k, v in snapshot["accounts"].items()} != accounts):
+                snapshot = await fetch_balances(accounts, self.client, ledger_index)
+            self._snapshot, self._checked_at = snapshot, time.monotonic()
+            return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+CACHE = BalanceCache()
+
+async def get_balances() -> dict:
+    return await CACHE.get()
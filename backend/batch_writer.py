@@ -0,0 +1,178 @@
+"""
+Group-commit writer for donation records.
+
+Callers hand records to a bounded queue and get a future back. A background
+thread drains the queue, writes up to BATCH_MAX_SIZE records with one
+multi-row INSERT ... ON CONFLICT DO NOTHING and a single commit, then
+resolves every caller's future. A batch is flushed when it is full or
+BATCH_MAX_DELAY seconds after its first record arrived. If the combined
+INSERT fails, each caller's page is retried in its own transaction, so one
+bad row only fails its own caller. Pages whose caller cancelled before the
+write started are dropped. When the queue is full, submit() blocks
+up to BATCH_ENQUEUE_TIMEOUT and then raises WriterBusy.
+
+The listener also hands over its per-address ledger checkpoints here, so a
+checkpoint commits in the same transaction as (or after) the donations it
+covers and can never run ahead of them.
+"""
+import os, json, time, queue, asyncio, atexit, threading, concurrent.futures
+import psycopg2.extras
+import db
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "500"))
+BATCH_MAX_DELAY = float(os.getenv("BATCH_MAX_DELAY", "0.05"))
+BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", "10000"))
+BATCH_ENQUEUE_TIMEOUT = float(os.getenv("BATCH_ENQUEUE_TIMEOUT", "5"))
+
+class WriterBusy(Exception):
+    """The write queue stayed full for the whole enqueue timeout"""
+
+class BatchWriter:
+    def __init__(self, max_size=BATCH_MAX_SIZE, max_delay=BATCH_MAX_DELAY,
+                 queue_size=BATCH_QUEUE_SIZE, enqueue_timeout=BATCH_ENQUEUE_TIMEOUT):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self.stats = {"batches": 0, "records": 0, "failed_batches": 0}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, record: dict, timeout: float | None = None) -> concurrent.futures.Future:
+        """Queue a donation record; the future resolves once its batch commits"""
+        return self.submit_page([record], timeout=timeout)
+
+    def submit_page(self, records, checkpoints=(), timeout: float | None = None) -> concurrent.futures.Future:
+        """
+        Queue records together with listener checkpoints [(address, ledger)];
+        they are never split across batches, so all of them commit at once
+        """
+        future = concurrent.futures.Future()
+        rows = [(record["tx"], json.dumps(record)) for record in records]
+        timeout = self.enqueue_timeout if timeout is None else timeout
+        try:
+            self._queue.put((rows, list(checkpoints), future), timeout=timeout)
+        except queue.Full:
+            raise WriterBusy(f"Donation write queue full ({self._queue.maxsize} pending)")
+        return future
+
+    def write(self, record: dict, timeout: float | None = None):
+        """Write one record; timeout covers both queueing and the commit"""
+        started = time.monotonic()
+        future = self.submit(record, timeout=timeout)
+        remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+        future.result(remaining)
+
+    async def write_async(self, record: dict):
+        await self.write_page_async([record])
+
+    async def write_page_async(self, records, checkpoints=()):
+        try:
+            future = self.submit_page(records, checkpoints, timeout=0)
+        except WriterBusy:
+            # Under backpressure wait for queue space off the event loop
+            future = await asyncio.to_thread(self.submit_page, records, checkpoints)
+        await asyncio.wrap_future(future)
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_delay
+        while size < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+            size += len(batch[-1][0])
+        return batch
+
+    def _flush(self, batch):
+        # Claim every future first: callers that gave up (cancelled) before
+        # the write started are dropped, the rest can no longer be cancelled
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if batch:
+            self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            records = self._write(batch)
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            if len(batch) == 1:
+                print(f"Error writing {len(batch[0][0])} donation records: {e}")
+                batch[0][2].set_exception(e)
+                return
+            # Find the bad page(s): retry every caller on its own, in order
+            print(f"Error writing batch of {len(batch)} pages, retrying them one by one: {e}")
+            for item in batch:
+                self._commit([item])
+            return
+        self.stats["batches"] += 1
+        self.stats["records"] += records
+        for _, _, future in batch:
+            future.set_result(None)
+
+    def _write(self, batch) -> int:
+        """Insert the batch's records and checkpoints in one transaction"""
+        rows = [row for item_rows, _, _ in batch for row in item_rows]
+        checkpoints = {}
+        for _, item_checkpoints, _ in batch:
+            for address, ledger in item_checkpoints:
+                checkpoints[address] = max(ledger, checkpoints.get(address, ledger))
+        with db.connection() as conn, conn.cursor() as cur:
+            if rows:
+                psycopg2.extras.execute_values(
+                    cur,
+                    "INSERT INTO donations (tx, data) VALUES %s ON CONFLICT DO NOTHING",
+                    rows,
+                    page_size=len(rows)
+                )
+            if checkpoints:
+                psycopg2.extras.execute_values(
+                    cur,
+                    "INSERT INTO listener_checkpoints (address, ledger_index) VALUES %s "
+                    "ON CONFLICT (address) DO UPDATE SET updated_at = now(), "
+                    "ledger_index = GREATEST(listener_checkpoints.ledger_index, EXCLUDED.ledger_index)",
+                    list(checkpoints.items()),
+                    page_size=len(checkpoints)
+                )
+        return len(rows)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    # Never let one batch take the writer thread down
+                    print(f"Batch writer error: {e}")
+
+    def close(self, timeout: float = 10):
+        """Flush whatever is queued and stop the writer thread"""
+        self._stopping.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+
+def get_writer() -> BatchWriter:
+    """Process-wide writer, started on first use and flushed at exit"""
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = BatchWriter().start()
+                atexit.register(_WRITER.close)
+    return _WRITER
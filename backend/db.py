@@ -0,0 +1,203 @@
+"""
+Shared Postgres connection pool for the API, the listener and the XRPL utilities
+"""
+import os, time, asyncio, threading, contextlib
+import psycopg2, psycopg2.pool, psycopg2.extensions
+
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections idle for longer than this are pinged before being handed out
+POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within the pool timeout"""
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe psycopg2 pool.
+
+    Callers block (up to `timeout` seconds) while all `max_size` connections
+    are checked out instead of failing straight away like psycopg2's own pool.
+    Stale connections are detected on checkout and replaced transparently.
+    """
+
+    def __init__(self, dsn, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 timeout=POOL_TIMEOUT, health_check_after=POOL_HEALTH_CHECK_AFTER):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._pool = psycopg2.pool.ThreadedConnectionPool(min_size, max_size, dsn)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._stats = {
+            "acquired": 0,
+            "timeouts": 0,
+            "in_use": 0,
+            "replaced": 0,
+            "wait_total_s": 0.0,
+            "wait_max_s": 0.0,
+        }
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available after {timeout}s")
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats["acquired"] += 1
+            self._stats["in_use"] += 1
+            self._stats["wait_total_s"] += waited
+            self._stats["wait_max_s"] = max(self._stats["wait_max_s"], waited)
+        return conn
+
+    def putconn(self, conn, close=False):
+        try:
+            if not conn.closed and not close:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        close = True
+            self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=close or conn.closed)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        last_used = self._last_used.get(id(conn), 0.0)
+        if conn.closed or time.monotonic() - last_used > self.health_check_after:
+            if not self._is_alive(conn):
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self._stats["replaced"] += 1
+                conn = self._pool.getconn()
+        return conn
+
+    @staticmethod
+    def _is_alive(conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """Check out a connection; commit on success, roll back on error"""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    def ping(self):
+        """Round-trip a trivial query through the pool"""
+        started = time.monotonic()
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+        return time.monotonic() - started
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["max_size"] = self.max_size
+        stats["wait_avg_s"] = stats["wait_total_s"] / stats["acquired"] if stats["acquired"] else 0.0
+        return stats
+
+    def close(self):
+        self._pool.closeall()
+
+class AsyncConnectionPool:
+    """
+    asyncio front-end for ConnectionPool.
+
+    psycopg2 is blocking, so checkout and queries run on worker threads; the
+    event loop only ever awaits them.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @contextlib.asynccontextmanager
+    async def connection(self, timeout=None):
+        conn = await asyncio.to_thread(self.pool.getconn, timeout)
+        try:
+            yield conn
+            await asyncio.to_thread(conn.commit)
+        except Exception:
+            if not conn.closed:
+                await asyncio.to_thread(conn.rollback)
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(conn, *args, **kwargs) on a worker thread inside one transaction"""
+        def _call():
+            with self.pool.connection() as conn:
+                return fn(conn, *args, **kwargs)
+        return await asyncio.to_thread(_call)
+
+    async def ping(self):
+        return await asyncio.to_thread(self.pool.ping)
+
+    def stats(self):
+        return self.pool.stats()
+
+_POOL = None
+_ASYNC_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool():
+    """Process-wide pool, created lazily so forked workers get their own"""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ConnectionPool(os.getenv("POSTGRES_URL"))
+    return _POOL
+
+def get_async_pool():
+    global _ASYNC_POOL
+    if _ASYNC_POOL is None:
+        _ASYNC_POOL = AsyncConnectionPool(get_pool())
+    return _ASYNC_POOL
+
+def connection(timeout=None):
+    """Shortcut for get_pool().connection()"""
+    return get_pool().connection(timeout)
+
+def close_pool():
+    global _POOL, _ASYNC_POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+        _POOL = None
+        _ASYNC_POOL = None
@@ -0,0 +1,74 @@
+"""
+EDMS donation memos: build, hash, validate and encode.
+
+The JSON schema is compiled into a validator once at import. A memo is
+serialized exactly once: the canonical (sorted-key) JSON of its fields is
+hashed to produce `ph`, and the same string, with `ph` appended, is what
+goes on chain.
+"""
+import json, pathlib
+from datetime import datetime, timezone
+from hashlib import sha256
+from typing import NamedTuple
+import jsonschema
+
+SCHEMA = json.load(open(pathlib.Path(__file__).parent/"edms_schema.json"))
+_Validator = jsonschema.validators.validator_for(SCHEMA)
+_Validator.check_schema(SCHEMA)
+VALIDATOR = _Validator(SCHEMA)
+
+class EncodedMemo(NamedTuple):
+    fields: dict
+    json: str
+
+    @property
+    def hex(self) -> str:
+        return self.json.encode().hex()
+
+def validate(fields: dict):
+    """Raise jsonschema.ValidationError if the memo does not match the schema"""
+    if not VALIDATOR.is_valid(fields):
+        raise jsonschema.exceptions.best_match(VALIDATOR.iter_errors(fields))
+
+def build(charity: str, cid: str, amount: float, ts: str | None = None) -> EncodedMemo:
+    fields = {
+        "cid": cid,
+        "chr": charity,
+        "amt": amount,
+        "cur": "RLUSD",
+        "ts": ts or datetime.now(timezone.utc).isoformat(timespec="seconds")
+    }
+    canonical = json.dumps(fields, sort_keys=True)
+    ph = sha256(canonical.encode()).hexdigest()
+    fields["ph"] = ph
+    validate(fields)
+    return EncodedMemo(fields, f'{canonical[:-1]}, "ph": "{ph}"}}')
+
+def encode(fields: dict) -> EncodedMemo:
+    """Encode an already-built memo (e.g. one read back from the outbox)"""
+    body = {k: v for k, v in fields.items() if k != "ph"}
+    canonical = json.dumps(body, sort_keys=True)
+    return EncodedMemo(fields, f'{canonical[:-1]}, "ph": "{fields["ph"]}"}}')
+
+def decode(memo_hex: str) -> dict | None:
+    """Decode on-chain MemoData; None if it is not a JSON object"""
+    try:
+        memo = json.loads(bytes.fromhex(memo_hex))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return memo if isinstance(memo, dict) else None
+
+def validate_many(memos) -> list:
+    """
+    Validate a batch of decoded memos with the shared validator.
+    Returns one entry per memo: None if valid, otherwise the error message.
+    """
+    results = []
+    for fields in memos:
+        if fields is not None and VALIDATOR.is_valid(fields):
+            results.append(None)
+        elif fields is None:
+            results.append("not a JSON object")
+        else:
+            results.append(jsonschema.exceptions.best_match(VALIDATOR.iter_errors(fields)).message)
+    return results
@@ -0,0 +1,115 @@
+"""
+Federated learning client for any number of charities.
+
+    python fl/client.py --charities MEDA,TARA                # one process, a thread per charity
+    python fl/client.py --charities MEDA,TARA --processes 4  # charities spread over 4 processes
+    python fl/client.py --charities MEDA,TARA --simulate     # in-process simulation, no server
+
+Each charity gets its own model and streams its own rows of donor_features
+(see features.py). The default charity list is FL_CHARITIES. Simulation
+runs the server in the same process through Flower's virtual client engine
+and needs `pip install "flwr[simulation]"`.
+"""
+import os, time, argparse, threading, multiprocessing
+import numpy as np
+import flwr as fl
+from features import FeatureSource, new_model, train_epoch, evaluate
+import compression
+
+CHARITIES = [c.strip().upper() for c in os.getenv("FL_CHARITIES", "MEDA,TARA").split(",") if c.strip()]
+NUM_ROUNDS = int(os.getenv("FL_NUM_ROUNDS", "3"))
+GRPC_MAX_MESSAGE_LENGTH = 536_870_912   # Flower's default
+
+class CharityClient(fl.client.NumPyClient):
+    def __init__(self, charity: str):
+        self.charity = charity
+        self.source = FeatureSource(charity)
+        self.model = new_model()
+
+    def get_parameters(self, config):
+        return [self.model.coef_, self.model.intercept_]
+
+    def set_parameters(self, params):
+        # Copies: training updates the model's arrays in place
+        self.model.coef_ = np.array(params[0], dtype=np.float64)
+        self.model.intercept_ = np.array(params[1], dtype=np.float64)
+
+    def fit(self, params, config):
+        started = time.monotonic()
+        mode, delta = compression.from_config(config)
+        received = compression.decode(params, mode)
+        self.set_parameters(received)
+        n = train_epoch(self.model, self.source)
+        update = compression.encode(self.get_parameters(config), mode, received if delta else None)
+        return update, n, {
+            "charity": self.charity, "fit_duration_s": time.monotonic() - started
+        }
+
+    def evaluate(self, params, config):
+        started = time.monotonic()
+        mode, _ = compression.from_config(config)
+        self.set_parameters(compression.decode(params, mode))
+        loss, accuracy, n = evaluate(self.model, self.source)
+        return loss, n, {
+            "charity": self.charity, "accuracy": accuracy,
+            "evaluate_duration_s": time.monotonic() - started
+        }
+
+def run_client(charity: str, server_address: str, slot: int = 0):
+    # gRPC shares one connection between channels with identical arguments,
+    # and the server tells clients apart by connection; a distinct message
+    # size limit per client in this process keeps their channels separate
+    fl.client.start_numpy_client(
+        server_address=server_address, client=CharityClient(charity),
+        grpc_max_message_length=GRPC_MAX_MESSAGE_LENGTH - slot,
+    )
+
+def run_group(charities, server_address: str):
+    """Run several charity clients side by side in this process"""
+    threads = [threading.Thread(target=run_client, args=(c, server_address, i), name=f"fl-{c}")
+               for i, c in enumerate(charities)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def run_pool(charities, server_address: str, processes: int):
+    groups = [charities[i::processes] for i in range(processes)]
+    workers = [multiprocessing.Process(target=run_group, args=(group, server_address))
+               for group in groups if group]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+def simulate(charities, num_rounds: int = NUM_ROUNDS, strategy=None):
+    strategy = strategy or fl.server.strategy.FedAvg(
+        fraction_fit=1.0, fraction_evaluate=1.0,
+        min_fit_clients=len(charities), min_available_clients=len(charities)
+    )
+    return fl.simulation.start_simulation(
+        client_fn=lambda cid: CharityClient(charities[int(cid)]),
+        num_clients=len(charities),
+        config=fl.server.ServerConfig(num_rounds=num_rounds),
+        strategy=strategy,
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Federated learning clients")
+    parser.add_argument("--charities", default=",".join(CHARITIES), help="comma-separated charity codes")
+    parser.add_argument("--server", default=os.getenv("FL_SERVER_HOST"))
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--simulate", action="store_true")
+    parser.add_argument("--rounds", type=int, default=NUM_ROUNDS, help="rounds when simulating")
+    args = parser.parse_args(argv)
+
+    charities = [c.strip().upper() for c in args.charities.split(",") if c.strip()]
+    if args.simulate:
+        simulate(charities, args.rounds)
+    elif args.processes > 1:
+        run_pool(charities, args.server, args.processes)
+    else:
+        run_group(charities, args.server)
+
+if __name__ == "__main__":
+    main()
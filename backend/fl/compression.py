@@ -0,0 +1,82 @@
+"""
+Compressed parameter exchange for federated rounds.
+
+Opt-in through FL_COMPRESSION on the server ("none", "float16" or "int8")
+and FL_DELTA=1; the server passes both to the clients in the fit/evaluate
+config, so clients need no settings of their own.
+
+  float16  all tensors are sent as one flat float16 array
+  int8     all tensors are sent as one flat int8 array plus one float64
+           scale per tensor (symmetric)
+  delta    clients send their update relative to the global model they
+           received this round instead of the full parameters
+
+Packing the tensors into one array (plus a small shape layout) matters
+for small models: each array sent through Flower carries its own ~128 byte
+header. The server sends the global model with the same quantization, and
+both sides use the decoded copy as the delta reference so they agree
+exactly.
+"""
+import os
+import numpy as np
+
+MODES = ("none", "float16", "int8")
+COMPRESSION = os.getenv("FL_COMPRESSION", "none")
+DELTA = os.getenv("FL_DELTA", "0") == "1"
+
+def _layout(ndarrays) -> np.ndarray:
+    """ndim followed by the dimensions, for each tensor"""
+    return np.array([d for a in ndarrays for d in (a.ndim, *a.shape)], dtype=np.int64)
+
+def _unpack(flat, layout):
+    tensors, offset, i = [], 0, 0
+    while i < len(layout):
+        ndim = int(layout[i])
+        shape = tuple(int(d) for d in layout[i + 1:i + 1 + ndim])
+        size = int(np.prod(shape, dtype=np.int64))
+        tensors.append(flat[offset:offset + size].reshape(shape))
+        offset += size
+        i += 1 + ndim
+    return tensors
+
+def encode(ndarrays, mode: str, reference=None):
+    """Transport form of ndarrays; with reference, of their difference to it"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown compression mode {mode!r}")
+    ndarrays = [np.asarray(a, dtype=np.float64) for a in ndarrays]
+    if reference is not None:
+        ndarrays = [a - r for a, r in zip(ndarrays, reference)]
+    if mode == "none":
+        return ndarrays
+    layout = _layout(ndarrays)
+    flat = np.concatenate([a.ravel() for a in ndarrays]) if ndarrays else np.zeros(0)
+    if mode == "float16":
+        limit = np.finfo(np.float16).max
+        return [np.clip(flat, -limit, limit).astype(np.float16), layout]
+    scales = np.array([float(np.abs(a).max()) / 127 if a.size and np.abs(a).max() else 1.0
+                       for a in ndarrays])
+    sizes = [a.size for a in ndarrays]
+    q = np.round(flat / np.repeat(scales, sizes)).astype(np.int8)
+    return [q, scales, layout]
+
+def decode(encoded, mode: str, reference=None):
+    """Inverse of encode, as float64 arrays"""
+    if mode == "float16":
+        flat, layout = encoded
+        ndarrays = _unpack(flat.astype(np.float64), layout)
+    elif mode == "int8":
+        q, scales, layout = encoded
+        ndarrays = [t.astype(np.float64) * scale for t, scale in zip(_unpack(q, layout), scales)]
+    else:
+        ndarrays = [np.asarray(a, dtype=np.float64) for a in encoded]
+    if reference is not None:
+        ndarrays = [a + r for a, r in zip(ndarrays, reference)]
+    return ndarrays
+
+def config(mode: str = COMPRESSION, delta: bool = DELTA) -> dict:
+    """Fit/evaluate config entries telling clients how to (de)compress"""
+    return {"compression": mode, "delta": int(delta)}
+
+def from_config(config: dict):
+    """(mode, delta) from a fit/evaluate config; uncompressed if absent"""
+    return config.get("compression", "none"), bool(config.get("delta", 0))
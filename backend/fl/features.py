@@ -0,0 +1,98 @@
+"""
+Chunked feature loading for the federated learning clients.
+
+A charity's rows of the donor_features store are read through a
+server-side cursor into a preallocated NumPy buffer of FL_CHUNK_SIZE rows,
+and the model is trained on one chunk at a time with
+SGDClassifier.partial_fit, so peak memory depends on the chunk size, not on
+the number of donors. Nothing is read from the database until the first fit.
+"""
+import os, uuid
+import numpy as np
+import psycopg2
+from sklearn.linear_model import SGDClassifier
+
+FEATURES = ("rl_amt", "days_since", "gift_count")
+CHUNK_SIZE = int(os.getenv("FL_CHUNK_SIZE", "10000"))
+CLASSES = np.array([0, 1])
+
+def connect():
+    return psycopg2.connect(os.getenv("POSTGRES_URL"))
+
+# Same columns as the <charity>_features views, for any charity
+_FEATURES_SQL = """
+SELECT total_amount AS rl_amt,
+       EXTRACT(EPOCH FROM (now() - last_gift_at))/86400 AS days_since,
+       gift_count
+FROM donor_features WHERE charity = %s
+"""
+
+def iter_chunks(conn, charity: str, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield (X, y) per chunk. Both are views into buffers reused for the next
+    chunk, so consume them before advancing.
+    """
+    X = np.empty((chunk_size, len(FEATURES)), dtype=np.float64)
+    y = np.empty(chunk_size, dtype=np.int64)
+    with conn.cursor(name=f"features_{uuid.uuid4().hex}") as cur:
+        cur.itersize = chunk_size
+        cur.execute(_FEATURES_SQL, (charity,))
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            n = len(rows)
+            X[:n] = np.asarray(rows, dtype=np.float64)
+            np.nan_to_num(X[:n], copy=False)
+            y[:n] = X[:n, 2] > 1   # repeat donor
+            yield X[:n], y[:n]
+    conn.rollback()
+
+def dummy_chunks():
+    """Random stand-in data, used while a charity has nothing to learn from"""
+    yield np.random.rand(10, len(FEATURES)), np.random.randint(0, 2, 10)
+
+def new_model() -> SGDClassifier:
+    """Logistic-regression model with zeroed parameters, ready for partial_fit"""
+    model = SGDClassifier(loss="log_loss", random_state=0)
+    model.partial_fit(np.zeros((2, len(FEATURES))), CLASSES, classes=CLASSES)
+    model.coef_ = np.zeros((1, len(FEATURES)))
+    model.intercept_ = np.zeros(1)
+    return model
+
+class FeatureSource:
+    """Streams one charity's features from a fresh connection per pass"""
+
+    def __init__(self, charity: str, chunk_size: int = CHUNK_SIZE):
+        self.charity = charity.upper()
+        self.chunk_size = chunk_size
+
+    def chunks(self):
+        conn = connect()
+        try:
+            yielded = False
+            for X, y in iter_chunks(conn, self.charity, self.chunk_size):
+                yielded = True
+                yield X, y
+        finally:
+            conn.close()
+        if not yielded:
+            yield from dummy_chunks()
+
+def train_epoch(model: SGDClassifier, source: FeatureSource) -> int:
+    """One pass of partial_fit over every chunk; returns the number of rows"""
+    seen = 0
+    for X, y in source.chunks():
+        model.partial_fit(X, y, classes=CLASSES)
+        seen += len(X)
+    return seen
+
+def evaluate(model: SGDClassifier, source: FeatureSource):
+    """(mean log loss, accuracy, rows), accumulated chunk by chunk"""
+    loss, correct, seen = 0.0, 0, 0
+    for X, y in source.chunks():
+        p = np.clip(model.predict_proba(X)[:, 1], 1e-15, 1 - 1e-15)
+        loss += float(-(y * np.log(p) + (1 - y) * np.log(1 - p)).sum())
+        correct += int(((p >= 0.5) == y).sum())
+        seen += len(X)
+    return (loss / seen, correct / seen, seen) if seen else (0.0, 0.0, 0)
@@ -1,9 +1,14 @@
+import os
 import flwr as fl
+from strategy import InstrumentedFedAvg
+
+strategy = InstrumentedFedAvg(
+    fraction_fit=1.0, min_fit_clients=2, min_available_clients=2
+)
+strategy.metrics.serve()
 
 fl.server.start_server(
     server_address="[::]:8080",
-    config=fl.server.ServerConfig(num_rounds=0),  # 0 means run indefinitely
-    strategy=fl.server.strategy.FedAvg(
-        fraction_fit=1.0, min_fit_clients=2, min_available_clients=2
-    ),
-) 
\ No newline at end of file
+    config=fl.server.ServerConfig(num_rounds=int(os.getenv("FL_NUM_ROUNDS", "3"))),
+    strategy=strategy,
+)
@@ -0,0 +1,219 @@
+"""
+FedAvg with round instrumentation and model checkpoints.
+
+After every aggregated round the global parameters are written to
+FL_CHECKPOINT_DIR as latest.npz, plus round_<n>.npz for the last
+FL_CHECKPOINT_KEEP rounds (0 keeps latest.npz only). On start the strategy
+resumes from latest.npz, and round numbers continue from the checkpoint.
+
+Per-round wall time, per-client fit/evaluate latency (reported by the
+clients as fit_duration_s / evaluate_duration_s) and parameter payload
+sizes are kept in memory and served in Prometheus text format on
+FL_METRICS_PORT.
+
+With FL_COMPRESSION / FL_DELTA set (see compression.py) parameters are
+quantized, and client updates delta-encoded, in both directions; payload
+metrics count the bytes actually sent.
+"""
+import os, time, pathlib, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import flwr as fl
+from flwr.common import ndarrays_to_parameters, parameters_to_ndarrays
+import compression
+
+CHECKPOINT_DIR = pathlib.Path(os.getenv("FL_CHECKPOINT_DIR", "checkpoints"))
+CHECKPOINT_KEEP = int(os.getenv("FL_CHECKPOINT_KEEP", "5"))
+METRICS_PORT = int(os.getenv("FL_METRICS_PORT", "9090"))
+
+def payload_bytes(parameters) -> int:
+    return sum(len(tensor) for tensor in parameters.tensors)
+
+def save_checkpoint(directory: pathlib.Path, server_round: int, ndarrays, keep: int = CHECKPOINT_KEEP):
+    """
+    Atomically replace latest.npz; also write round_<n>.npz and delete
+    round files beyond the newest `keep`
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    arrays = {f"arr_{i}": a for i, a in enumerate(ndarrays)}
+    tmp = directory/"latest.tmp.npz"
+    np.savez(tmp, round=server_round, **arrays)
+    os.replace(tmp, directory/"latest.npz")
+    if keep > 0:
+        np.savez(directory/f"round_{server_round:05d}.npz", round=server_round, **arrays)
+    rounds = sorted(directory.glob("round_*.npz"), key=lambda p: int(p.stem[6:]))
+    for old in rounds[:max(len(rounds) - keep, 0)]:
+        old.unlink(missing_ok=True)
+
+def load_checkpoint(path: pathlib.Path):
+    """(round, [ndarrays]) from a checkpoint file, or (0, None) if absent"""
+    if not path.exists():
+        return 0, None
+    with np.load(path) as data:
+        keys = sorted((k for k in data.files if k.startswith("arr_")), key=lambda k: int(k[4:]))
+        return int(data["round"]), [data[k] for k in keys]
+
+class Metrics:
+    """Latest values per metric and label set, rendered as Prometheus text"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._gauges = {}     # (name, labels) -> value
+        self._counters = {}
+        self._help = {}
+
+    def set(self, name, value, help_text="", **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = float(value)
+            self._help.setdefault(name, (help_text, "gauge"))
+
+    def inc(self, name, value=1, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + float(value)
+            self._help.setdefault(name, (help_text, "counter"))
+
+    def render(self) -> str:
+        with self._lock:
+            samples = {**self._gauges, **self._counters}
+            described = dict(self._help)
+        lines, seen = [], set()
+        for (name, labels), value in sorted(samples.items()):
+            if name not in seen:
+                help_text, kind = described[name]
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                seen.add(name)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = METRICS_PORT):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, name="fl-metrics", daemon=True).start()
+        return server
+
+def weighted_accuracy(results):
+    """Example-weighted mean of the clients' reported accuracy"""
+    total = sum(n for n, _ in results)
+    if not total:
+        return {}
+    return {"accuracy": sum(n * m.get("accuracy", 0.0) for n, m in results) / total}
+
+class InstrumentedFedAvg(fl.server.strategy.FedAvg):
+    def __init__(self, *args, checkpoint_dir=CHECKPOINT_DIR, metrics=None,
+                 compression_mode=compression.COMPRESSION, delta=compression.DELTA, **kwargs):
+        kwargs.setdefault("evaluate_metrics_aggregation_fn", weighted_accuracy)
+        super().__init__(*args, **kwargs)
+        self.checkpoint_dir = pathlib.Path(checkpoint_dir)
+        self.metrics = metrics or Metrics()
+        self.compression_mode = compression_mode
+        self.delta = delta
+        self.round_offset = 0
+        self._round_started = {}
+        self._references = {}   # server round -> global model as clients decode it
+
+    @property
+    def compressing(self) -> bool:
+        return self.compression_mode != "none" or self.delta
+
+    def _compress(self, parameters, instructions):
+        """Swap in the encoded global model; returns it as clients will decode it"""
+        payload = compression.encode(parameters_to_ndarrays(parameters), self.compression_mode)
+        encoded = ndarrays_to_parameters(payload)
+        for _, ins in instructions:
+            ins.parameters = encoded
+            ins.config.update(compression.config(self.compression_mode, self.delta))
+        return compression.decode(payload, self.compression_mode)
+
+    def _record_payload(self, direction, nbytes):
+        self.metrics.inc("fl_payload_bytes_total", nbytes,
+                         "Parameter bytes sent or received", direction=direction)
+        self.metrics.set("fl_round_payload_bytes", nbytes,
+                         "Parameter bytes on the wire in the last round", direction=direction)
+
+    def _round(self, server_round: int) -> int:
+        """Round number across restarts"""
+        return self.round_offset + server_round
+
+    def initialize_parameters(self, client_manager):
+        saved_round, ndarrays = load_checkpoint(self.checkpoint_dir/"latest.npz")
+        if ndarrays is None:
+            return super().initialize_parameters(client_manager)
+        self.round_offset = saved_round
+        print(f"Resuming from checkpoint of round {saved_round}")
+        return ndarrays_to_parameters(ndarrays)
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        self._round_started[server_round] = time.monotonic()
+        instructions = super().configure_fit(server_round, parameters, client_manager)
+        if self.compressing and instructions:
+            self._references[server_round] = self._compress(parameters, instructions)
+        self._record_payload("down",
+                             sum(payload_bytes(ins.parameters) for _, ins in instructions))
+        return instructions
+
+    def configure_evaluate(self, server_round, parameters, client_manager):
+        instructions = super().configure_evaluate(server_round, parameters, client_manager)
+        if self.compressing and instructions:
+            self._compress(parameters, instructions)
+        return instructions
+
+    def _decompress(self, server_round, results):
+        reference = self._references.pop(server_round, None) if self.delta else None
+        for _, res in results:
+            ndarrays = compression.decode(parameters_to_ndarrays(res.parameters),
+                                          self.compression_mode, reference)
+            res.parameters = ndarrays_to_parameters(ndarrays)
+
+    def _record_clients(self, results, stage: str):
+        for _, res in results:
+            charity = res.metrics.get("charity", "unknown")
+            duration = res.metrics.get(f"{stage}_duration_s")
+            if duration is not None:
+                self.metrics.set(f"fl_client_{stage}_duration_seconds", duration,
+                                 f"Last client {stage} latency", charity=charity)
+
+    def aggregate_fit(self, server_round, results, failures):
+        self._record_payload("up", sum(payload_bytes(res.parameters) for _, res in results))
+        if self.compressing:
+            self._decompress(server_round, results)
+        self._references.pop(server_round, None)
+        self._record_clients(results, "fit")
+        self.metrics.inc("fl_client_failures_total", len(failures), "Failed client calls", stage="fit")
+
+        parameters, aggregated = super().aggregate_fit(server_round, results, failures)
+        if parameters is not None:
+            round_number = self._round(server_round)
+            save_checkpoint(self.checkpoint_dir, round_number, parameters_to_ndarrays(parameters))
+            self.metrics.set("fl_checkpoint_round", round_number, "Round of the latest checkpoint")
+        started = self._round_started.pop(server_round, None)
+        if started is not None:
+            elapsed = time.monotonic() - started
+            self.metrics.set("fl_round_duration_seconds", elapsed, "Wall time of the last training round")
+            self.metrics.inc("fl_rounds_completed_total", 1, "Completed training rounds")
+            print(f"Round {self._round(server_round)} trained on {len(results)} clients in {elapsed:.2f}s")
+        return parameters, aggregated
+
+    def aggregate_evaluate(self, server_round, results, failures):
+        self._record_clients(results, "evaluate")
+        self.metrics.inc("fl_client_failures_total", len(failures), "Failed client calls", stage="evaluate")
+        loss, aggregated = super().aggregate_evaluate(server_round, results, failures)
+        if loss is not None:
+            self.metrics.set("fl_round_loss", loss, "Aggregated evaluation loss of the last round")
+        if "accuracy" in aggregated:
+            self.metrics.set("fl_round_accuracy", aggregated["accuracy"], "Aggregated evaluation accuracy of the last round")
+        return loss, aggregated
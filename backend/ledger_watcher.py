@@ -0,0 +1,222 @@
+"""
+Shared confirmation engine for submitted XRPL transactions.
+
+One websocket subscription follows the validated-ledger stream. Each new
+ledger's transaction hashes are matched against a map of pending hashes and
+the matching futures are resolved, instead of every submitter polling `tx`
+for its own transaction. Entries whose LastLedgerSequence has passed are
+failed with TransactionExpired.
+
+The engine runs on its own thread and event loop so both the async API path
+and the synchronous CLI utilities can wait on it.
+"""
+import os, asyncio, threading, contextlib, concurrent.futures
+from xrpl.asyncio.clients import AsyncWebsocketClient
+from xrpl.models.requests import Ledger, Subscribe, StreamParameter, Tx
+from xrpl.models.response import Response, ResponseStatus
+from xrpl.transaction import autofill_and_sign, submit, XRPLReliableSubmissionException
+from xrpl.asyncio.transaction import autofill_and_sign as autofill_and_sign_async, submit as submit_async
+
+XRPL_WSS_URL = os.getenv("XRPL_WSS_URL", "wss://s.altnet.rippletest.net:51233")
+# After a reconnect, replay at most this many missed ledgers one by one;
+# beyond that pending transactions are looked up individually
+MAX_CATCHUP_LEDGERS = int(os.getenv("LEDGER_WATCHER_MAX_CATCHUP", "20"))
+RECONNECT_DELAY = float(os.getenv("LEDGER_WATCHER_RECONNECT_DELAY", "2"))
+WAIT_TIMEOUT = float(os.getenv("LEDGER_WATCHER_WAIT_TIMEOUT", "300"))
+
+class TransactionExpired(XRPLReliableSubmissionException):
+    """LastLedgerSequence passed without the transaction being validated"""
+
+class TransactionRejected(XRPLReliableSubmissionException):
+    """The server rejected the transaction on submit; it can never apply"""
+
+    def __init__(self, engine_result: str, message: str | None = None):
+        super().__init__(f"{engine_result}: {message}")
+        self.engine_result = engine_result
+
+class LedgerWatcher:
+    def __init__(self, url: str = XRPL_WSS_URL):
+        self.url = url
+        self.last_ledger = None
+        self._pending = {}   # tx hash -> (last_ledger_sequence, [futures])
+        self._lock = threading.Lock()
+        self._loop = None
+        self._started = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(target=self._thread_main, name="ledger-watcher", daemon=True)
+        thread.start()
+        self._started.wait()
+        return self
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._started.set()
+        self._loop.run_until_complete(self._run())
+
+    def watch(self, tx_hash: str, last_ledger_sequence: int) -> concurrent.futures.Future:
+        """
+        Future resolved with the validated `tx` result, or failed with
+        TransactionExpired. Register before submitting to avoid races.
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            entry = self._pending.setdefault(tx_hash, (last_ledger_sequence, []))
+            entry[1].append(future)
+        return future
+
+    async def wait_async(self, tx_hash: str, last_ledger_sequence: int, timeout: float = WAIT_TIMEOUT):
+        return await asyncio.wait_for(
+            asyncio.wrap_future(self.watch(tx_hash, last_ledger_sequence)), timeout
+        )
+
+    def forget(self, tx_hash: str):
+        with self._lock:
+            entry = self._pending.pop(tx_hash, None)
+        for future in (entry[1] if entry else []):
+            future.cancel()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _resolve(self, tx_hash: str, result=None, error=None):
+        with self._lock:
+            entry = self._pending.pop(tx_hash, None)
+        for future in (entry[1] if entry else []):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _run(self):
+        while True:
+            try:
+                async with AsyncWebsocketClient(self.url) as client:
+                    response = await client.request(Subscribe(streams=[StreamParameter.LEDGER]))
+                    if response.is_successful() and "ledger_index" in response.result:
+                        await self._on_validated(client, int(response.result["ledger_index"]))
+                    print(f"Ledger watcher subscribed via {self.url}")
+                    async for message in client:
+                        if message.get("type") == "ledgerClosed":
+                            await self._on_validated(client, int(message["ledger_index"]))
+            except Exception as e:
+                print(f"Ledger watcher connection error: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _on_validated(self, client, ledger_index: int):
+        previous = self.last_ledger
+        self.last_ledger = ledger_index
+        if not self.pending_count():
+            return
+        if previous is None or ledger_index - previous > MAX_CATCHUP_LEDGERS:
+            # Too far behind to replay ledger by ledger
+            await self._lookup_each(client)
+        else:
+            for index in range(previous + 1, ledger_index + 1):
+                await self._scan_ledger(client, index)
+        await self._expire(client, ledger_index)
+
+    async def _scan_ledger(self, client, ledger_index: int):
+        response = await client.request(Ledger(ledger_index=ledger_index, transactions=True, expand=False))
+        if not response.is_successful():
+            print(f"Ledger watcher could not fetch ledger {ledger_index}: {response.result}")
+            return
+        hashes = response.result["ledger"].get("transactions", [])
+        with self._lock:
+            ours = [h for h in hashes if h in self._pending]
+        await asyncio.gather(*(self._confirm(client, h) for h in ours))
+
+    async def _confirm(self, client, tx_hash: str) -> bool:
+        response = await client.request(Tx(transaction=tx_hash))
+        if response.is_successful() and response.result.get("validated"):
+            self._resolve(tx_hash, result=response.result)
+            return True
+        return False
+
+    async def _lookup_each(self, client):
+        with self._lock:
+            hashes = list(self._pending)
+        await asyncio.gather(*(self._confirm(client, h) for h in hashes))
+
+    async def _expire(self, client, ledger_index: int):
+        with self._lock:
+            expired = [h for h, (lls, _) in self._pending.items() if lls is not None and lls < ledger_index]
+        for tx_hash in expired:
+            # One last direct lookup in case a ledger was missed
+            if not await self._confirm(client, tx_hash):
+                self._resolve(tx_hash, error=TransactionExpired(
+                    f"{tx_hash} not validated by LastLedgerSequence (now at {ledger_index})"
+                ))
+
+_WATCHER = None
+_WATCHER_LOCK = threading.Lock()
+
+def get_watcher() -> LedgerWatcher:
+    """Process-wide watcher, started on first use"""
+    global _WATCHER
+    if _WATCHER is None:
+        with _WATCHER_LOCK:
+            if _WATCHER is None:
+                _WATCHER = LedgerWatcher().start()
+    return _WATCHER
+
+def _check_prelim(response):
+    """Raise TransactionRejected for a tem/tef/tel preliminary result"""
+    prelim = response.result["engine_result"]
+    if prelim[:3] in ("tem", "tef", "tel") and prelim != "tefALREADY":
+        raise TransactionRejected(prelim, response.result.get("engine_result_message"))
+
+def _check_result(result) -> dict:
+    code = result["meta"]["TransactionResult"]
+    if code != "tesSUCCESS":
+        raise XRPLReliableSubmissionException(f"Transaction failed: {code}")
+    return result
+
+def submit_and_wait(transaction, client, wallet=None, timeout: float = WAIT_TIMEOUT):
+    """
+    Drop-in replacement for xrpl.transaction.submit_and_wait that waits on the
+    shared watcher instead of polling. Without wallet the transaction must
+    already be signed. Raises TransactionRejected, TransactionExpired or
+    XRPLReliableSubmissionException if it is rejected, expires or fails.
+    """
+    signed = autofill_and_sign(transaction, client, wallet) if wallet is not None else transaction
+    tx_hash = signed.get_hash()
+    watcher = get_watcher()
+    # Register before submitting so the validating ledger can't be missed
+    future = watcher.watch(tx_hash, signed.last_ledger_sequence)
+    try:
+        _check_prelim(submit(signed, client))
+        result = future.result(timeout)
+    except BaseException:
+        watcher.forget(tx_hash)
+        raise
+    return Response(status=ResponseStatus.SUCCESS, result=_check_result(result))
+
+async def submit_and_wait_async(transaction, client, wallet=None, timeout: float = WAIT_TIMEOUT,
+                                limiter=None):
+    """
+    submit_and_wait for async callers; returns the validated `tx` result.
+    Signing and submitting run inside `limiter` (e.g. a semaphore) if
+    given, waiting for validation does not.
+    """
+    watcher = get_watcher()
+    tx_hash = None
+    try:
+        async with limiter or contextlib.nullcontext():
+            signed = transaction
+            if wallet is not None:
+                signed = await autofill_and_sign_async(transaction, client, wallet)
+            tx_hash = signed.get_hash()
+            confirmation = asyncio.wrap_future(watcher.watch(tx_hash, signed.last_ledger_sequence))
+            response = await submit_async(signed, client)
+        _check_prelim(response)
+        result = await asyncio.wait_for(confirmation, timeout)
+    except BaseException:
+        if tx_hash is not None:
+            watcher.forget(tx_hash)
+        raise
+    return _check_result(result)
@@ -1,29 +1,312 @@
-import os, json, time, psycopg2, xrpl
-from xrpl.models.requests import AccountTx
+"""
+XRPL donation listener.
 
-def get_db():
-    return psycopg2.connect(os.getenv("POSTGRES_URL"))
+Keeps a websocket subscription to the watched accounts (plus the ledger
+stream, to track how far it has read) and records every incoming
+transaction that carries a valid EDMS memo. Large watch lists are
+subscribed in chunks of LISTENER_SUBSCRIBE_CHUNK accounts.
 
-CLIENT = xrpl.clients.JsonRpcClient(os.getenv("XRPL_RPC"))
+Each address's read position is checkpointed in listener_checkpoints,
+committed together with the donations it covers. After a (re)start every
+address resumes from its checkpoint (inclusive) and drains every AccountTx
+page up to the subscription ledger, at most LISTENER_CONCURRENCY addresses
+at a time. An address whose catch-up fails is retried with its own
+exponential backoff; the others are unaffected. If a streamed donation
+fails to commit, its addresses are re-read from that ledger the same way,
+and no checkpoint is written while streamed pages are still in flight. Addresses seen for the
+first time start at the current ledger (use `listener.py backfill` for
+history). Re-inserting a donation is a no-op, so overlapping catch-up and
+stream delivery is harmless.
+"""
+import os, sys, time, asyncio
+from xrpl.asyncio.clients import AsyncWebsocketClient
+from xrpl.models.requests import AccountTx, Subscribe, StreamParameter
+import db, batch_writer, edms, wallets
+
+XRPL_WSS_URL = os.getenv("XRPL_WSS_URL", "wss://s.altnet.rippletest.net:51233")
+RECONNECT_DELAY = float(os.getenv("LISTENER_RECONNECT_DELAY", "2"))
+CONCURRENCY = int(os.getenv("LISTENER_CONCURRENCY", "16"))
+SUBSCRIBE_CHUNK = int(os.getenv("LISTENER_SUBSCRIBE_CHUNK", "200"))
+RETRY_BASE = float(os.getenv("LISTENER_RETRY_BASE", "2"))
+RETRY_MAX = float(os.getenv("LISTENER_RETRY_MAX", "300"))
+# How often checkpoints of idle, caught-up addresses are persisted
+CHECKPOINT_INTERVAL = float(os.getenv("LISTENER_CHECKPOINT_INTERVAL", "30"))
 
 def get_wallet_addresses():
-    try:
-        meda = xrpl.wallet.Wallet.from_seed(os.getenv("MEDA_WALLET_SEED")).classic_address
-        tara = xrpl.wallet.Wallet.from_seed(os.getenv("TARA_WALLET_SEED")).classic_address
-        return {meda: "MEDA", tara: "TARA"}
-    except Exception as e:
-        print(f"Warning: Could not initialize wallet addresses: {e}")
-        return {}
+    addresses = {w.classic_address: charity for charity, w in wallets.charity_wallets().items()}
+    if not addresses:
+        print("Warning: Could not initialize wallet addresses")
+    return addresses
+
+def get_watch_addresses():
+    """
+    {address: label} for the charity wallets plus LISTENER_WATCH_ADDRESSES,
+    a comma-separated list of `address` or `address=label` entries
+    """
+    watch = get_wallet_addresses()
+    for entry in os.getenv("LISTENER_WATCH_ADDRESSES", "").split(","):
+        address, _, label = entry.strip().partition("=")
+        if address:
+            watch.setdefault(address, label or address)
+    return watch
 
 def insert(tx_hash: str, memo: dict):
-    with get_db(), get_db().cursor() as cur:
-        cur.execute("INSERT INTO donations (tx,data) VALUES (%s,%s) ON CONFLICT DO NOTHING",
-                    (tx_hash, json.dumps(memo)))
-        get_db().commit()
+    batch_writer.get_writer().write({**memo, "tx": tx_hash})
+
+def insert_many(rows, checkpoints=()):
+    """Write (tx hash, memo) pairs and [(address, ledger)] checkpoints in one commit"""
+    records = [{**memo, "tx": tx_hash} for tx_hash, memo in rows]
+    batch_writer.get_writer().submit_page(records, checkpoints).result()
+
+async def insert_many_async(rows, checkpoints=()):
+    records = [{**memo, "tx": tx_hash} for tx_hash, memo in rows]
+    await batch_writer.get_writer().write_page_async(records, checkpoints)
+
+def load_checkpoints(addresses) -> dict:
+    """{address: ledger_index} for the addresses that have a checkpoint"""
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT address, ledger_index FROM listener_checkpoints WHERE address = ANY(%s)",
+                    (list(addresses),))
+        return dict(cur.fetchall())
+
+def tx_ledger_index(t) -> int:
+    """Ledger of an AccountTx entry; API v1 nests it in "tx", v2 has it on top"""
+    ledger_index = t.get("ledger_index")
+    if ledger_index is None:
+        ledger_index = (t.get("tx_json") or t.get("tx") or {})["ledger_index"]
+    return int(ledger_index)
+
+def donation_memos(txs):
+    """(tx hash, memo) for every transaction carrying a schema-valid EDMS memo"""
+    candidates = []
+    for t in txs:
+        tx_json = t.get("tx_json") or t.get("tx") or {}
+        if tx_json.get("Memos"):
+            memo_hex = tx_json["Memos"][0]["Memo"].get("MemoData", "")
+            candidates.append((t.get("hash") or tx_json["hash"], edms.decode(memo_hex)))
+    errors = edms.validate_many(memo for _, memo in candidates)
+    valid = []
+    for (tx_hash, memo), error in zip(candidates, errors):
+        if error:
+            print(f"Skipping {tx_hash}: memo is not a valid EDMS record ({error})")
+        else:
+            valid.append((tx_hash, memo))
+    return valid
+
+def _log_processed(rows):
+    for tx_hash, _ in rows:
+        print(f"Processed transaction: {tx_hash}")
+
+async def catch_up(client, address: str, from_ledger: int, to_ledger: int, state=None):
+    """
+    Record donations to address validated in [from_ledger, to_ledger],
+    checkpointing after every AccountTx page
+    """
+    marker = None
+    while True:
+        response = await client.request(AccountTx(
+            account=address, ledger_index_min=from_ledger, ledger_index_max=to_ledger,
+            forward=True, marker=marker
+        ))
+        if not response.is_successful():
+            if response.result.get("error") == "actNotFound":
+                # Unfunded account, nothing to read yet
+                await insert_many_async([], [(address, to_ledger)])
+                return
+            raise RuntimeError(f"AccountTx failed: {response.result}")
+        txs = response.result["transactions"]
+        marker = response.result.get("marker")
+        # Mid-range the last ledger on the page may continue on the next
+        # page; resuming from it inclusive is safe because inserts are idempotent
+        reached = to_ledger if marker is None else max(
+            [tx_ledger_index(t) for t in txs], default=from_ledger
+        )
+        rows = donation_memos(txs)
+        await insert_many_async(rows, [(address, reached)])
+        _log_processed(rows)
+        if state is not None:
+            state.ledger = max(state.ledger, reached)
+        if marker is None:
+            return
+
+def _stream_tx(message):
+    """AccountTx-shaped entry for a `transaction` stream message"""
+    tx_json = message.get("tx_json") or message.get("transaction") or {}
+    return {"tx_json": tx_json, "hash": message.get("hash") or tx_json.get("hash")}
+
+def _stream_accounts(message):
+    tx_json = message.get("tx_json") or message.get("transaction") or {}
+    return {tx_json.get("Account"), tx_json.get("Destination")} - {None}
+
+class AddressState:
+    """How far one watched address has been read, and its retry schedule"""
+
+    def __init__(self, address: str, label: str):
+        self.address = address
+        self.label = label
+        self.ledger = None      # recorded through this validated ledger
+        self.synced = False     # caught up to the current subscription
+        self.failures = 0
+        self.retry_at = 0.0
+        self.rewind = None      # re-read from here after a failed stream write
+        self.rewinds = 0
+
+    def failed(self, error):
+        self.failures += 1
+        delay = min(RETRY_MAX, RETRY_BASE * 2 ** (self.failures - 1))
+        self.retry_at = time.monotonic() + delay
+        print(f"Catch-up for {self.address} ({self.label}) failed, retrying in {delay:.0f}s: {error}")
+
+class Listener:
+    def __init__(self, watch: dict, concurrency: int = CONCURRENCY):
+        self.states = {address: AddressState(address, label) for address, label in watch.items()}
+        self.concurrency = concurrency
+        self.ledger = None      # last validated ledger seen on the stream
+        self._inflight = set()
+        self._checkpointed_at = time.monotonic()
+        self._client = None
+        self._sync = None
+        self._sync_to = 0       # ledger every address must be caught up to
+
+    def restore(self):
+        """Resume each address from its stored checkpoint"""
+        for address, ledger in load_checkpoints(self.states).items():
+            self.states[address].ledger = ledger
+        restored = sum(state.ledger is not None for state in self.states.values())
+        print(f"Restored checkpoints for {restored} of {len(self.states)} addresses")
+
+    async def run(self):
+        while True:
+            try:
+                async with AsyncWebsocketClient(XRPL_WSS_URL) as client:
+                    subscribed_at = await self._subscribe(client)
+                    self._client = client
+                    self._sync = asyncio.create_task(self._sync_all(client, subscribed_at))
+                    try:
+                        await self._consume(client)
+                    finally:
+                        self._sync.cancel()
+                        self._client = None
+            except Exception as e:
+                print(f"Listener connection error: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _subscribe(self, client) -> int:
+        """Subscribe in chunks; returns the validated ledger at subscription time"""
+        addresses = list(self.states)
+        ledger = None
+        for start in range(0, max(len(addresses), 1), SUBSCRIBE_CHUNK):
+            chunk = addresses[start:start + SUBSCRIBE_CHUNK]
+            streams = [StreamParameter.LEDGER] if start == 0 else None
+            response = await client.request(Subscribe(accounts=chunk, streams=streams))
+            if not response.is_successful():
+                raise RuntimeError(f"subscribe failed: {response.result}")
+            ledger = ledger or response.result.get("ledger_index")
+        ledger = int(ledger)
+        new = []
+        for state in self.states.values():
+            if state.ledger is None:
+                state.ledger = ledger   # never seen before: read from now on
+                new.append((state.address, ledger))
+            state.synced = state.ledger >= ledger
+            state.failures, state.retry_at = 0, 0.0
+        if new:
+            await insert_many_async([], new)
+        self.ledger = ledger
+        print(f"Subscribed to {len(addresses)} addresses at ledger {ledger}")
+        return ledger
+
+    async def _consume(self, client):
+        async for message in client:
+            kind = message.get("type")
+            if kind == "ledgerClosed":
+                self.ledger = int(message["ledger_index"])
+                for state in self.states.values():
+                    if state.synced:
+                        state.ledger = self.ledger
+                # Only once every earlier streamed page has committed (or
+                # failed and rolled its addresses back), so a checkpoint
+                # never passes donations that were not stored
+                if not self._inflight and time.monotonic() - self._checkpointed_at >= CHECKPOINT_INTERVAL:
+                    self._checkpointed_at = time.monotonic()
+                    await self._write([], [(state.address, state.ledger)
+                                           for state in self.states.values() if state.synced])
+            elif kind == "transaction" and message.get("validated"):
+                rows = donation_memos([_stream_tx(message)])
+                if rows:
+                    accounts = [a for a in _stream_accounts(message) if a in self.states]
+                    await self._write(rows, (), accounts, message.get("ledger_index"))
+
+    async def _write(self, rows, checkpoints, accounts=(), ledger=None):
+        """
+        Enqueue now, so the writer sees records and checkpoints in stream
+        order, but don't hold up the stream while the batch commits
+        """
+        writer = batch_writer.get_writer()
+        records = [{**memo, "tx": tx_hash} for tx_hash, memo in rows]
+        try:
+            future = writer.submit_page(records, checkpoints, timeout=0)
+        except batch_writer.WriterBusy:
+            future = await asyncio.to_thread(writer.submit_page, records, checkpoints)
+        task = asyncio.ensure_future(asyncio.wrap_future(future))
+        self._inflight.add(task)
+        task.add_done_callback(lambda t: self._write_done(t, rows, accounts, ledger))
+
+    def _write_done(self, task, rows, accounts, ledger):
+        self._inflight.discard(task)
+        if task.cancelled():
+            return
+        if task.exception():
+            print(f"Error recording streamed donations: {task.exception()}")
+            self._resync(accounts, ledger)
+        else:
+            _log_processed(rows)
+
+    def _resync(self, accounts, ledger):
+        """Re-read accounts from ledger (inclusive) after their stream write failed"""
+        ledger = int(ledger) if ledger is not None else self.ledger
+        for address in accounts:
+            state = self.states[address]
+            state.rewind = min(state.rewind or ledger, ledger)
+            state.rewinds += 1
+            state.synced = False
+        self._sync_to = max(self._sync_to, ledger)
+        if accounts and self._client is not None and (self._sync is None or self._sync.done()):
+            self._sync = asyncio.create_task(self._sync_all(self._client, self._sync_to))
+
+    async def _sync_all(self, client, to_ledger: int):
+        """Catch up every lagging address, each with its own retry schedule"""
+        slots = asyncio.Semaphore(self.concurrency)
+        self._sync_to = max(self._sync_to, to_ledger)
+
+        async def sync(state):
+            async with slots:
+                rewinds, target = state.rewinds, self._sync_to
+                if state.rewind is not None:
+                    state.ledger, state.rewind = min(state.ledger, state.rewind), None
+                try:
+                    await catch_up(client, state.address, state.ledger, target, state)
+                except Exception as e:
+                    state.failed(e)
+                    return
+                if state.rewinds != rewinds:
+                    return      # a stream write failed meanwhile; go again
+                state.ledger = max(state.ledger, target)
+                state.synced = True
+
+        while True:
+            now = time.monotonic()
+            due = [s for s in self.states.values() if not s.synced and s.retry_at <= now]
+            if due:
+                await asyncio.gather(*(sync(state) for state in due))
+            elif all(s.synced for s in self.states.values()):
+                return
+            else:
+                await asyncio.sleep(1)
 
 def poll():
     print("Starting XRPL listener...")
-    watch = get_wallet_addresses()
+    watch = get_watch_addresses()
     if not watch:
         print("No valid wallet addresses found, running in mock mode")
         # Run in mock mode - just keep the service alive
@@ -31,36 +314,14 @@ def poll():
             time.sleep(10)
             print("Listener running in mock mode...")
         return
-    
-    print(f"Watching addresses: {list(watch.keys())}")
-    
-    # Initialize ledger tracking
-    for addr in watch:
-        try:
-            last = CLIENT.request(AccountTx(account=addr, limit=1)).result["transactions"]
-            if last: 
-                watch[addr] = int(last[0]["ledger_index"])
-                print(f"Initialized {addr} at ledger {watch[addr]}")
-        except Exception as e:
-            print(f"Error initializing {addr}: {e}")
-            watch[addr] = 0
-    
-    while True:
-        try:
-            for addr, chr_id in list(watch.items()):
-                req = AccountTx(account=addr, ledger_index_min=watch[addr]+1, ledger_index_max=-1)
-                txs = CLIENT.request(req).result["transactions"]
-                for t in txs:
-                    tx_json = t["tx_json"]; meta = t["meta"]
-                    if "Memos" in tx_json and tx_json["Memos"]:
-                        memo_hex = tx_json["Memos"][0]["Memo"]["MemoData"]
-                        memo = json.loads(bytes.fromhex(memo_hex))
-                        insert(tx_json["hash"], memo)
-                        print(f"Processed transaction: {tx_json['hash']}")
-                    watch[addr] = int(t["ledger_index"])
-            time.sleep(4)
-        except Exception as e:
-            print(f"Error in polling loop: {e}")
-            time.sleep(10)
 
-if __name__ == "__main__": poll() 
\ No newline at end of file
+    print(f"Watching {len(watch)} addresses")
+    listener = Listener(watch)
+    listener.restore()
+    asyncio.run(listener.run())
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["backfill"]:
+        import backfill
+        sys.exit(backfill.main(sys.argv[2:]))
+    poll()
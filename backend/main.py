@@ -1,9 +1,14 @@
-import os, json, psycopg2, psycopg2.extras
-from fastapi import FastAPI
+import os, json, uuid, base64, asyncio, psycopg2, psycopg2.extras
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+import numpy as np
+import db, outbox, scoring, balances
+from totals import fetch_totals
 import requests
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from xrpl_utils import send_rlusd_payment, save_record, send_rlusd_payment_from_seed
+from xrpl_utils import (send_rlusd_payment_async, save_record_async,
+                        send_rlusd_payment_from_seed_async, get_charity_destinations, build_memo)
 
 app = FastAPI()
 
@@ -14,14 +19,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "Eunoia Atlas API is running"}
 
-def get_db():
-    return psycopg2.connect(os.getenv("POSTGRES_URL"))
+@app.get("/health/db")
+async def db_health():
+    pool = db.get_async_pool()
+    try:
+        latency = await pool.ping()
+    except Exception as e:
+        return {"status": "unhealthy", "error": str(e), "pool": pool.stats()}
+    return {"status": "healthy", "latency_s": round(latency, 4), "pool": pool.stats()}
+
+@app.on_event("shutdown")
+def close_db_pool():
+    db.close_pool()
 
 class DonationReq(BaseModel):
     charity: str             # "MEDA" or "TARA"
@@ -58,13 +74,42 @@ class XamanPaymentRequest(BaseModel):
     asset: str | None = None  # 'XRP' for native, else RLUSD by default
     issuer: str | None = None # optional custom issuer for IOU
 
-@app.post("/donate")
+class ScoreRequest(BaseModel):
+    donors: list[str] | None = None      # donor hashes to score; all donors if omitted
+    rows: list[list[float]] | None = None  # or raw [rl_amt, days_since, gift_count] rows
+
+@app.post("/donate", status_code=202)
 async def donate(req: DonationReq):
-    tx_hash, memo = send_rlusd_payment(req.charity.upper(), req.cid, req.amount)
-    rec = {**memo, "tx": tx_hash, "donor_email": req.donor_email}
-    save_record(rec)
-    return {"tx": tx_hash,
-            "track": f"https://testnet.xrpl.org/transactions/{tx_hash}"}
+    """Queue the donation in the outbox; a worker submits it to XRPL"""
+    charity = req.charity.upper()
+    if charity not in get_charity_destinations():
+        raise HTTPException(status_code=400, detail=f"Invalid charity: {req.charity}")
+    memo = build_memo(charity, req.cid, req.amount)
+    job_id = await db.get_async_pool().run(
+        outbox.enqueue, charity, req.amount, memo, {"donor_email": req.donor_email}
+    )
+    return {"job_id": job_id, "status": "queued", "status_url": f"/donations/{job_id}"}
+
+@app.get("/donations/{job_id}")
+async def donation_status(job_id: uuid.UUID):
+    job = await db.get_async_pool().run(outbox.get_job, str(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown donation job")
+    resp = {
+        "job_id": str(job["id"]),
+        "status": job["status"],
+        "charity": job["charity"],
+        "amount": float(job["amount"]),
+        "attempts": job["attempts"],
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat(),
+    }
+    if job["status"] == "done":
+        resp["tx"] = job["tx"]
+        resp["track"] = f"https://testnet.xrpl.org/transactions/{job['tx']}"
+    elif job["last_error"]:
+        resp["last_error"] = job["last_error"]
+    return resp
 
 @app.post("/donations")
 async def submit_donor_intent(req: DonorIntentRequest):
@@ -84,7 +129,7 @@ async def submit_donor_intent(req: DonorIntentRequest):
     
     try:
         # Create XRPL transaction
-        tx_hash, memo = send_rlusd_payment(charity, cause_id, amount_rlusd)
+        tx_hash, memo = await send_rlusd_payment_async(charity, cause_id, amount_rlusd)
         
         # Save donation record with donor intent
         rec = {
@@ -97,7 +142,7 @@ async def submit_donor_intent(req: DonorIntentRequest):
             "currency_fiat": req.currency,
             "amount_fiat": req.amountFiat
         }
-        save_record(rec)
+        await save_record_async(rec)
         
         return {
             "success": True,
@@ -136,7 +181,7 @@ async def confirm_xumm_payment(confirmation: XummPaymentConfirmation):
             "payload_id": confirmation.payload_id
         }
         
-        save_record(rec)
+        await save_record_async(rec)
         
         return {
             "status": "success",
@@ -149,9 +194,9 @@ async def confirm_xumm_payment(confirmation: XummPaymentConfirmation):
 @app.post("/demo/user-to-charity")
 async def demo_user_to_charity(req: ServerSignedUserPayment):
     """Server-signed demo: send RLUSD from provided user seed to charity"""
-    tx_hash, memo = send_rlusd_payment_from_seed(req.sender_seed, req.charity.upper(), req.cause_id, req.amount)
+    tx_hash, memo = await send_rlusd_payment_from_seed_async(req.sender_seed, req.charity.upper(), req.cause_id, req.amount)
     rec = {**memo, "tx": tx_hash, "ph": memo.get("ph")}
-    save_record(rec)
+    await save_record_async(rec)
     return {"tx": tx_hash, "track": f"https://testnet.xrpl.org/transactions/{tx_hash}"}
 
 @app.post("/xaman/create-payment")
@@ -266,17 +311,99 @@ async def xaman_check_payload(payload_id: str):
 
 @app.get("/totals")
 async def totals():
-    with get_db(), get_db().cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute("SELECT data->>'chr' chr, SUM((data->>'amt')::NUMERIC) total "
-                    "FROM donations GROUP BY chr;")
-        return {row["chr"]: float(row["total"]) for row in cur.fetchall()}
+    return await db.get_async_pool().run(fetch_totals)
+
+@app.get("/balances")
+async def wallet_balances():
+    """XRP and trustline balances of the charity and platform wallets"""
+    try:
+        return await balances.get_balances()
+    except Exception as e:
+        print(f"Balance refresh failed: {e}")
+        raise HTTPException(status_code=502, detail="Could not read balances from the XRPL server")
+
+SCORES_PAGE_SIZE = int(os.getenv("SCORES_PAGE_SIZE", "1000"))
+SCORES_PAGE_MAX = int(os.getenv("SCORES_PAGE_MAX", "10000"))
+SCORES_STREAM_CHUNK = int(os.getenv("SCORES_STREAM_CHUNK", "2000"))
+
+# One row per donor from the donor_features store, in donor_hash order so
+# a page can resume after the last key it returned (primary key order)
+_SCORES_SQL = """
+SELECT donor_hash, gift_count FROM donor_features
+WHERE charity = %s AND donor_hash > %s
+ORDER BY donor_hash
+"""
+
+def _encode_cursor(donor_hash):
+    return base64.urlsafe_b64encode(json.dumps([donor_hash]).encode()).decode()
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return ""
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(value, list) or len(value) != 1 or not isinstance(value[0], str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value[0]
+
+def _fetch_scores(conn, charity, after, limit):
+    with conn.cursor() as cur:
+        cur.execute(_SCORES_SQL + "LIMIT %s", (charity, after, limit))
+        return cur.fetchall()
+
+async def _stream_scores(charity, after):
+    """NDJSON rows from a server-side cursor, SCORES_STREAM_CHUNK at a time"""
+    async with db.get_async_pool().connection() as conn:
+        cur = conn.cursor(name=f"scores_{uuid.uuid4().hex}")
+        cur.itersize = SCORES_STREAM_CHUNK
+        await asyncio.to_thread(cur.execute, _SCORES_SQL, (charity, after))
+        while True:
+            rows = await asyncio.to_thread(cur.fetchmany, SCORES_STREAM_CHUNK)
+            if not rows:
+                break
+            yield "".join(json.dumps({"ph": donor_hash, "gift_count": gift_count}) + "\n"
+                          for donor_hash, gift_count in rows)
 
 @app.get("/scores/{charity}")
-async def scores(charity:str):
-    view = "meda_features" if charity.upper()=="MEDA" else "tara_features"
-    with get_db(), get_db().cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute(f"SELECT donor_hash, gift_count FROM {view};")
-        return [{"ph": r["donor_hash"], "gift_count": r["gift_count"]} for r in cur.fetchall()]
+async def scores(charity: str, response: Response, limit: int | None = None,
+                 cursor: str | None = None, format: str = "json"):
+    """
+    Donor scores. Without limit or cursor every row is returned, as before.
+    With either, one page is returned (SCORES_PAGE_SIZE rows unless limit
+    says otherwise) and the cursor for the next page is in the
+    X-Next-Cursor header (absent on the last page). format=ndjson streams
+    every row from the cursor onwards instead.
+    """
+    charity = "MEDA" if charity.upper() == "MEDA" else "TARA"
+    after = _decode_cursor(cursor)
+    if format == "ndjson":
+        return StreamingResponse(_stream_scores(charity, after), media_type="application/x-ndjson")
+    if limit is None and cursor is None:
+        rows = await db.get_async_pool().run(_fetch_scores, charity, after, None)   # LIMIT NULL
+        return [{"ph": donor_hash, "gift_count": gift_count} for donor_hash, gift_count in rows]
+    limit = max(1, min(limit or SCORES_PAGE_SIZE, SCORES_PAGE_MAX))
+    rows = await db.get_async_pool().run(_fetch_scores, charity, after, limit)
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1][0])
+    return [{"ph": donor_hash, "gift_count": gift_count} for donor_hash, gift_count in rows]
+
+@app.post("/scores/{charity}/predict")
+async def predict_scores(charity: str, req: ScoreRequest | None = None):
+    """Repeat-donor probability from the latest federated model"""
+    model = await scoring.get_store().get_async()
+    if model is None:
+        raise HTTPException(status_code=503, detail="No federated model checkpoint available yet")
+    req = req or ScoreRequest()
+    if req.rows is not None:
+        if any(len(row) != len(scoring.FEATURES) for row in req.rows):
+            raise HTTPException(status_code=400, detail=f"Each row needs {len(scoring.FEATURES)} values: {', '.join(scoring.FEATURES)}")
+        X = np.array(req.rows, dtype=np.float64).reshape(-1, len(scoring.FEATURES))
+        return {"model_round": model.round, "scores": model.score(X).tolist()}
+    charity = "MEDA" if charity.upper() == "MEDA" else "TARA"
+    scored = await db.get_async_pool().run(scoring.score_donors, model, charity, req.donors)
+    return {"model_round": model.round, "scores": [{"ph": ph, "score": score} for ph, score in scored]}
 
 @app.post("/payout/{charity}")
 async def payout(charity: str):
@@ -0,0 +1,123 @@
+"""
+Apply the SQL migrations in sql/migrations and run data backfills.
+
+    python migrate.py            # apply pending migrations (backfills with 002)
+    python migrate.py status     # list applied and pending migrations
+    python migrate.py backfill   # only (re)run the backfills
+    python migrate.py refresh-features   # rebuild donor_features from donations
+
+Each migration file runs in its own transaction and is recorded in
+schema_migrations. An advisory lock keeps concurrent runners from racing.
+"""
+import os, sys, pathlib
+import db
+
+MIGRATIONS_DIR = pathlib.Path(__file__).parent/"sql"/"migrations"
+BACKFILL_BATCH = int(os.getenv("MIGRATE_BACKFILL_BATCH", "5000"))
+_LOCK_ID = 0x45554E4F  # arbitrary, shared by all runners
+# donated_at only needs backfilling in the run that adds the column
+BACKFILL_MIGRATION = "002_typed_donation_columns"
+
+def _migration_files():
+    return sorted(MIGRATIONS_DIR.glob("*.sql"))
+
+def _applied(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations("
+            "version TEXT PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        )
+        cur.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cur.fetchall()}
+
+def migrate() -> list:
+    """Apply every migration not yet recorded, in filename order; returns those applied"""
+    newly_applied = []
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_ID,))
+        try:
+            applied = _applied(conn)
+            conn.commit()
+            for path in _migration_files():
+                if path.stem in applied:
+                    continue
+                print(f"Applying migration {path.name}...")
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(path.read_text())
+                        cur.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (path.stem,))
+                    conn.commit()
+                    newly_applied.append(path.stem)
+                except Exception:
+                    conn.rollback()
+                    print(f"Migration {path.name} failed")
+                    raise
+            print("Migrations up to date")
+        finally:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_ID,))
+    return newly_applied
+
+def status():
+    with db.connection() as conn:
+        applied = _applied(conn)
+    for path in _migration_files():
+        print(f"{'applied' if path.stem in applied else 'pending'}  {path.name}")
+
+def backfill_donated_at(batch_size: int = BACKFILL_BATCH):
+    """Fill donations.donated_at for rows written before the trigger existed"""
+    last_tx, total = "", 0
+    while True:
+        with db.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH batch AS (
+                  SELECT tx FROM donations WHERE tx > %s ORDER BY tx LIMIT %s
+                ), updated AS (
+                  UPDATE donations d SET donated_at = donation_ts(d.data)
+                  FROM batch
+                  WHERE d.tx = batch.tx AND d.donated_at IS NULL AND donation_ts(d.data) IS NOT NULL
+                  RETURNING 1
+                )
+                SELECT (SELECT max(tx) FROM batch), (SELECT count(*) FROM updated)
+                """,
+                (last_tx, batch_size)
+            )
+            last_tx, updated = cur.fetchone()
+        if last_tx is None:
+            break
+        total += updated
+    print(f"Backfilled donated_at on {total} donations")
+    return total
+
+def backfill():
+    if backfill_donated_at():
+        # donor_features is only maintained on insert/delete
+        refresh_features()
+
+def up():
+    """Apply pending migrations; backfill only if this run added donated_at"""
+    if BACKFILL_MIGRATION in migrate():
+        backfill()
+
+def refresh_features():
+    """Rebuild the donor_features store from donations in one transaction"""
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT refresh_donor_features()")
+        donors = cur.fetchone()[0]
+    print(f"Rebuilt donor_features for {donors} donors")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "up"
+    if command == "up":
+        up()
+    elif command == "status":
+        status()
+    elif command == "backfill":
+        backfill()
+    elif command == "refresh-features":
+        refresh_features()
+    else:
+        print("Usage: python migrate.py [up|status|backfill|refresh-features]")
+        sys.exit(1)
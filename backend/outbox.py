@@ -0,0 +1,252 @@
+"""
+Durable donation outbox.
+
+The API only records a donation job here and returns its id. Worker processes
+claim jobs with FOR UPDATE SKIP LOCKED, sign and submit the RLUSD payment,
+retry with exponential backoff and finalize the row into `donations`. A job
+is only marked failed once its last signed payment is known to be final
+(failed on ledger or expired past its LastLedgerSequence). A claim is a
+lease: a worker only updates the job while its lease is the current one.
+
+    python outbox.py [--processes N] [--batch-size N]
+"""
+import os, json, time, random, asyncio, argparse, multiprocessing
+import psycopg2.extras
+import db
+import ledger_watcher, xrpl_utils
+
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))
+BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+# A claimed job is handed to another worker if not finished within the
+# lease, so it must outlast every validation wait a single attempt can make
+LEASE_SECONDS = int(os.getenv(
+    "OUTBOX_LEASE_SECONDS", str(int(ledger_watcher.WAIT_TIMEOUT * (xrpl_utils.SEQUENCE_RETRIES + 1)))
+))
+
+JOB_COLUMNS = "id, status, charity, amount, memo, extra, tx, tx_blob, last_ledger_sequence, attempts, last_error"
+# Writes by the worker holding a claim; locked_until doubles as the lease
+# token, so a worker whose lease expired can't overwrite its successor
+_LEASE_HELD = "id = %s AND status = 'processing' AND locked_until = %s"
+
+class LeaseLost(Exception):
+    """The job's lease expired and another worker claimed it"""
+
+def enqueue(conn, charity: str, amount: float, memo: dict, extra: dict | None = None) -> str:
+    """Insert a queued donation job and return its id"""
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO donation_outbox (charity, amount, memo, extra) "
+            "VALUES (%s, %s, %s, %s) RETURNING id",
+            (charity, amount, json.dumps(memo), json.dumps(extra or {}))
+        )
+        return str(cur.fetchone()[0])
+
+def get_job(conn, job_id: str):
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(
+            f"SELECT {JOB_COLUMNS}, created_at, updated_at FROM donation_outbox WHERE id = %s",
+            (job_id,)
+        )
+        return cur.fetchone()
+
+def claim(conn, limit: int = BATCH_SIZE):
+    """Lease up to `limit` due jobs; rows locked by other workers are skipped"""
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(
+            f"""
+            UPDATE donation_outbox SET
+              status = 'processing',
+              attempts = attempts + 1,
+              locked_until = now() + make_interval(secs => %(lease)s),
+              updated_at = now()
+            WHERE id IN (
+              SELECT id FROM donation_outbox
+              WHERE (status = 'queued' AND next_attempt_at <= now())
+                 OR (status = 'processing' AND locked_until < now())
+              ORDER BY next_attempt_at
+              LIMIT %(limit)s
+              FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {JOB_COLUMNS}, locked_until
+            """,
+            {"lease": LEASE_SECONDS, "limit": limit}
+        )
+        return cur.fetchall()
+
+def mark_signed(conn, job, tx_hash: str, tx_blob: str, last_ledger_sequence: int):
+    """Remember the signed transaction before submitting so a retry can't double-pay"""
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE donation_outbox SET tx = %s, tx_blob = %s, last_ledger_sequence = %s, "
+            f"updated_at = now() WHERE {_LEASE_HELD}",
+            (tx_hash, tx_blob, last_ledger_sequence, job["id"], job["locked_until"])
+        )
+        if cur.rowcount == 0:
+            raise LeaseLost(f"Outbox job {job['id']} was claimed by another worker")
+
+def finalize(conn, job, tx_hash: str):
+    """
+    Write the donation record and close the job in one transaction. The
+    payment happened, so the record is written even if the lease was lost.
+    """
+    record = {**job["memo"], "tx": tx_hash, **job["extra"]}
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO donations (tx, data) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+            (tx_hash, json.dumps(record))
+        )
+        cur.execute(
+            "UPDATE donation_outbox SET status = 'done', tx = %s, last_error = NULL, "
+            f"locked_until = NULL, updated_at = now() WHERE {_LEASE_HELD}",
+            (tx_hash, job["id"], job["locked_until"])
+        )
+        if cur.rowcount == 0:
+            print(f"Outbox job {job['id']} was claimed by another worker, recorded {tx_hash} only")
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(BACKOFF_MAX, BACKOFF_BASE ** attempts)
+    return delay * random.uniform(0.5, 1.0)
+
+def reschedule(conn, job, error: str, failed: bool | None = None):
+    """Queue the job for another attempt, or fail it (by default once attempts run out)"""
+    if failed is None:
+        failed = job["attempts"] >= MAX_ATTEMPTS
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE donation_outbox SET status = %s, last_error = %s, "
+            "next_attempt_at = now() + make_interval(secs => %s), locked_until = NULL, "
+            f"updated_at = now() WHERE {_LEASE_HELD}",
+            ("failed" if failed else "queued", error[:1000], backoff_seconds(job["attempts"]),
+             job["id"], job["locked_until"])
+        )
+        if cur.rowcount == 0:
+            raise LeaseLost(f"Outbox job {job['id']} was claimed by another worker")
+    return failed
+
+async def _run_db(fn, *args):
+    return await db.get_async_pool().run(fn, *args)
+
+async def _signed_outcome(job):
+    """Outcome of the job's signed payment; "pending" if it can't be determined"""
+    try:
+        return await xrpl_utils.get_transaction_outcome_async(job["tx"], job["last_ledger_sequence"])
+    except Exception as e:
+        print(f"Could not look up {job['tx']} for outbox job {job['id']}: {e}")
+        return "pending"
+
+async def process(job):
+    job_id = job["id"]
+    try:
+        if job["tx_blob"]:
+            # A previous attempt signed (and maybe submitted) this payment
+            outcome = await xrpl_utils.get_transaction_outcome_async(job["tx"], job["last_ledger_sequence"])
+            if outcome == "tesSUCCESS":
+                await _run_db(finalize, job, job["tx"])
+                print(f"Outbox job {job_id} confirmed on retry: {job['tx']}")
+                return
+            if outcome == "pending":
+                try:
+                    tx_hash = await xrpl_utils.submit_signed_payment_async(job["tx_blob"])
+                except xrpl_utils.StaleSequenceError:
+                    # Its sequence is gone: either it applied meanwhile or something else took it
+                    outcome = await xrpl_utils.get_transaction_outcome_async(job["tx"], job["last_ledger_sequence"])
+                    tx_hash = job["tx"] if outcome == "tesSUCCESS" else None
+                if tx_hash:
+                    await _run_db(finalize, job, tx_hash)
+                    print(f"Outbox job {job_id} completed: {tx_hash}")
+                    return
+            if job["attempts"] > MAX_ATTEMPTS:
+                # Only kept alive to settle the last signed payment, which is now final
+                raise xrpl_utils.PaymentSubmissionError(f"previous submission {job['tx']} {outcome}")
+            # Expired or failed on ledger: the old signature can never apply, so re-sign
+            print(f"Outbox job {job_id}: previous submission {job['tx']} {outcome}, re-signing")
+
+        for attempt in range(xrpl_utils.SEQUENCE_RETRIES):
+            signed = await xrpl_utils.sign_rlusd_payment_async(job["charity"], float(job["amount"]), job["memo"])
+            job["tx"], job["tx_blob"], job["last_ledger_sequence"] = (
+                signed.get_hash(), xrpl_utils.encode_signed(signed), signed.last_ledger_sequence
+            )
+            await _run_db(mark_signed, job, job["tx"], job["tx_blob"], job["last_ledger_sequence"])
+            try:
+                tx_hash = await xrpl_utils.submit_signed_payment_async(signed)
+            except xrpl_utils.StaleSequenceError as e:
+                print(f"Outbox job {job_id}: {e}, re-signing")
+                continue
+            await _run_db(finalize, job, tx_hash)
+            print(f"Outbox job {job_id} completed: {tx_hash}")
+            return
+        raise xrpl_utils.PaymentSubmissionError("Too many sequence conflicts")
+    except LeaseLost as e:
+        print(f"{e}, leaving it to that worker")
+    except Exception as e:
+        print(f"Outbox job {job_id} attempt {job['attempts']} failed: {e}")
+        failed = job["attempts"] >= MAX_ATTEMPTS
+        try:
+            if failed and job["tx"]:
+                # Never report a failure while the signed payment can still validate
+                outcome = await _signed_outcome(job)
+                if outcome == "tesSUCCESS":
+                    await _run_db(finalize, job, job["tx"])
+                    print(f"Outbox job {job_id} confirmed after its last attempt: {job['tx']}")
+                    return
+                if outcome == "pending":
+                    print(f"Outbox job {job_id}: {job['tx']} still pending, settling it before failing")
+                    failed = False
+            if await _run_db(reschedule, job, str(e), failed):
+                print(f"Outbox job {job_id} gave up after {job['attempts']} attempts")
+        except Exception as db_error:
+            # The lease expires and another worker picks the job up
+            print(f"Could not reschedule outbox job {job_id}: {db_error}")
+
+async def work(batch_size: int = BATCH_SIZE, poll_interval: float = POLL_INTERVAL):
+    print(f"Outbox worker {os.getpid()} started (batch size {batch_size})")
+    while True:
+        try:
+            jobs = await _run_db(claim, batch_size)
+        except Exception as e:
+            print(f"Error claiming outbox jobs: {e}")
+            await asyncio.sleep(poll_interval * 5)
+            continue
+        if not jobs:
+            await asyncio.sleep(poll_interval)
+            continue
+        await asyncio.gather(*(process(job) for job in jobs))
+
+def _worker_main(batch_size: int, poll_interval: float):
+    asyncio.run(work(batch_size, poll_interval))
+
+def run_pool(processes: int, batch_size: int = BATCH_SIZE, poll_interval: float = POLL_INTERVAL):
+    """Run `processes` independent workers; SKIP LOCKED keeps them off each other's rows"""
+    if processes <= 1:
+        _worker_main(batch_size, poll_interval)
+        return
+    workers = [
+        multiprocessing.Process(target=_worker_main, args=(batch_size, poll_interval), daemon=True)
+        for _ in range(processes)
+    ]
+    for w in workers:
+        w.start()
+    try:
+        while True:
+            for i, w in enumerate(workers):
+                if not w.is_alive():
+                    print(f"Outbox worker {w.pid} exited ({w.exitcode}), restarting")
+                    workers[i] = multiprocessing.Process(
+                        target=_worker_main, args=(batch_size, poll_interval), daemon=True
+                    )
+                    workers[i].start()
+            time.sleep(5)
+    except KeyboardInterrupt:
+        for w in workers:
+            w.terminate()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Donation outbox worker pool")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("OUTBOX_PROCESSES", "2")))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    args = parser.parse_args()
+    run_pool(args.processes, args.batch_size, args.poll_interval)
@@ -0,0 +1,221 @@
+"""
+Reconcile the donations table against the ledger.
+
+    python reconcile.py [--from LEDGER] [--to LEDGER] [--address ADDR ...]
+                        [--output FILE] [--insert-missing] [--delete-mock]
+                        [--delete-extra]
+
+Every transaction of the charity wallets is read from AccountTx and
+external-sorted by hash into temporary run files, with its memo if it
+carries a valid EDMS record. The runs are merged with the donations
+table, read through a server-side cursor in the same order, in a single
+pass. Memory is bounded by RECONCILE_RUN_SIZE rows whatever the table size.
+
+Each donation row is classified as:
+  missing  on ledger with a valid EDMS memo, not in donations
+  extra    in donations with a real-looking hash that no transaction of
+           the watched accounts has (donations confirmed through
+           /xumm/confirm-payment carry other memos and still match)
+  mock     in donations with a mock hash (lowercase hex, see
+           xrpl_utils._mock_tx_hash), i.e. a payment that never happened
+
+Without repair flags the job only reports. With --from/--to only that
+ledger range is read, so rows outside it show up as extra; --delete-extra
+is refused with a partial range.
+"""
+import os, re, sys, json, heapq, asyncio, argparse, tempfile, itertools
+from xrpl.asyncio.clients import AsyncJsonRpcClient
+from xrpl.models.requests import AccountTx
+import db
+from listener import get_wallet_addresses, donation_memos, insert_many
+
+XRPL_RPC = os.getenv("XRPL_RPC", "https://s.altnet.rippletest.net:51234")
+RUN_SIZE = int(os.getenv("RECONCILE_RUN_SIZE", "100000"))
+FETCH_SIZE = int(os.getenv("RECONCILE_FETCH_SIZE", "5000"))
+REPAIR_BATCH = int(os.getenv("RECONCILE_REPAIR_BATCH", "1000"))
+SAMPLE_SIZE = 10
+
+_MOCK_HASH = re.compile(r"[0-9a-f]{64}")
+
+def is_mock(tx_hash: str) -> bool:
+    return bool(_MOCK_HASH.fullmatch(tx_hash))
+
+class ExternalSorter:
+    """Sorts (hash, memo or None) pairs through temporary files of RUN_SIZE lines each"""
+
+    def __init__(self, run_size: int = RUN_SIZE):
+        self.run_size = run_size
+        self._buffer = []
+        self._runs = []
+
+    def add(self, tx_hash: str, memo: dict):
+        self._buffer.append((tx_hash, json.dumps(memo, separators=(",", ":"))))
+        if len(self._buffer) >= self.run_size:
+            self._spill()
+
+    def _spill(self):
+        run = tempfile.TemporaryFile("w+", encoding="utf-8")
+        for tx_hash, memo in sorted(self._buffer):
+            run.write(f"{tx_hash}\t{memo}\n")
+        run.seek(0)
+        self._runs.append(run)
+        self._buffer = []
+
+    @staticmethod
+    def _read(run):
+        for line in run:
+            tx_hash, memo = line.rstrip("\n").split("\t", 1)
+            yield tx_hash, memo
+
+    def sorted(self):
+        """Merged (hash, memo json) pairs, one per hash"""
+        if self._buffer:
+            self._spill()
+        merged = heapq.merge(*(self._read(run) for run in self._runs))
+        # The same payment shows up in the history of both its accounts
+        for tx_hash, group in itertools.groupby(merged, key=lambda row: row[0]):
+            yield next(group)
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+
+async def collect_ledger(addresses, sorter, from_ledger=-1, to_ledger=-1):
+    client = AsyncJsonRpcClient(XRPL_RPC)
+    scanned = 0
+    for address in addresses:
+        marker = None
+        while True:
+            response = await client.request(AccountTx(
+                account=address, ledger_index_min=from_ledger, ledger_index_max=to_ledger,
+                forward=True, marker=marker
+            ))
+            if not response.is_successful():
+                raise RuntimeError(f"AccountTx for {address} failed: {response.result}")
+            txs = response.result["transactions"]
+            scanned += len(txs)
+            memos = dict(donation_memos(txs))
+            for t in txs:
+                tx_json = t.get("tx_json") or t.get("tx") or {}
+                tx_hash = t.get("hash") or tx_json["hash"]
+                sorter.add(tx_hash, memos.get(tx_hash))
+            marker = response.result.get("marker")
+            if marker is None:
+                break
+    return scanned
+
+def db_rows(conn):
+    """(tx, data) for every donation in byte order of tx, to match Python's sort"""
+    cur = conn.cursor(name="reconcile_donations")
+    cur.itersize = FETCH_SIZE
+    cur.execute('SELECT tx, data FROM donations ORDER BY tx COLLATE "C"')
+    for tx, data in cur:
+        yield tx, data
+
+def merge(ledger, database):
+    """
+    Yield (kind, tx, memo) for every row that differs, in tx order. Ledger
+    transactions without a donation memo (memo json "null") only serve to
+    match existing rows.
+    """
+    ledger, database = iter(ledger), iter(database)
+    chain = next(ledger, None)
+    row = next(database, None)
+    while chain is not None or row is not None:
+        if row is None or (chain is not None and chain[0] < row[0]):
+            memo = json.loads(chain[1])
+            if memo is not None:
+                yield "missing", chain[0], memo
+            chain = next(ledger, None)
+        elif chain is None or row[0] < chain[0]:
+            yield ("mock" if is_mock(row[0]) else "extra"), row[0], row[1]
+            row = next(database, None)
+        else:
+            chain, row = next(ledger, None), next(database, None)
+
+class Repair:
+    """Applies the requested fixes in batches while the merge streams past"""
+
+    def __init__(self, insert_missing=False, delete_mock=False, delete_extra=False):
+        self.enabled = {"missing": insert_missing, "mock": delete_mock, "extra": delete_extra}
+        self._missing = []
+        self._delete = []
+        self.applied = {"missing": 0, "mock": 0, "extra": 0}
+
+    def add(self, kind, tx_hash, memo):
+        if not self.enabled[kind]:
+            return
+        if kind == "missing":
+            self._missing.append((tx_hash, memo))
+        else:
+            self._delete.append(tx_hash)
+        self.applied[kind] += 1
+        if len(self._missing) + len(self._delete) >= REPAIR_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self._missing:
+            insert_many(self._missing)
+            self._missing = []
+        if self._delete:
+            # Separate connection: the merge cursor's transaction stays read-only
+            with db.connection() as conn, conn.cursor() as cur:
+                cur.execute("DELETE FROM donations WHERE tx = ANY(%s)", (self._delete,))
+            self._delete = []
+
+def reconcile(addresses, from_ledger=-1, to_ledger=-1, output=None, repair=None):
+    if repair and repair.enabled["extra"] and (from_ledger != -1 or to_ledger != -1):
+        raise ValueError("Deleting extra rows needs the full ledger history, not a partial range")
+    sorter = ExternalSorter()
+    try:
+        scanned = asyncio.run(collect_ledger(addresses, sorter, from_ledger, to_ledger))
+        print(f"Read {scanned} ledger transactions for {len(addresses)} addresses")
+        counts = {"missing": 0, "extra": 0, "mock": 0}
+        samples = {kind: [] for kind in counts}
+        with db.connection() as conn:
+            for kind, tx_hash, memo in merge(sorter.sorted(), db_rows(conn)):
+                counts[kind] += 1
+                if len(samples[kind]) < SAMPLE_SIZE:
+                    samples[kind].append(tx_hash)
+                if output:
+                    output.write(json.dumps({"kind": kind, "tx": tx_hash, "data": memo}) + "\n")
+                if repair:
+                    repair.add(kind, tx_hash, memo)
+        if repair:
+            repair.flush()
+    finally:
+        sorter.close()
+
+    for kind, count in counts.items():
+        print(f"{kind}: {count}" + (f"  e.g. {', '.join(samples[kind])}" if count else ""))
+    if repair:
+        print("Repaired: " + ", ".join(f"{kind} {n}" for kind, n in repair.applied.items()))
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile donations against the ledger")
+    parser.add_argument("--from", dest="from_ledger", type=int, default=-1)
+    parser.add_argument("--to", dest="to_ledger", type=int, default=-1)
+    parser.add_argument("--address", action="append", help="address to read (default: charity wallets)")
+    parser.add_argument("--output", help="write every difference as NDJSON to this file")
+    parser.add_argument("--insert-missing", action="store_true")
+    parser.add_argument("--delete-mock", action="store_true")
+    parser.add_argument("--delete-extra", action="store_true")
+    args = parser.parse_args()
+    if args.delete_extra and (args.from_ledger != -1 or args.to_ledger != -1):
+        parser.error("--delete-extra needs the full ledger history; drop --from/--to")
+
+    addresses = args.address or list(get_wallet_addresses())
+    if not addresses:
+        print("No addresses to reconcile")
+        sys.exit(1)
+    repair = None
+    if args.insert_missing or args.delete_mock or args.delete_extra:
+        repair = Repair(args.insert_missing, args.delete_mock, args.delete_extra)
+    output = open(args.output, "w") if args.output else None
+    try:
+        counts = reconcile(addresses, args.from_ledger, args.to_ledger, output, repair)
+    finally:
+        if output:
+            output.close()
+    sys.exit(1 if any(counts.values()) and not repair else 0)
@@ -0,0 +1,93 @@
+"""
+Donor scoring with the federated model.
+
+ModelStore serves the latest global model checkpointed by fl/server.py
+(FL_CHECKPOINT_DIR/latest.npz) and reloads it when the file changes, so a
+new round is picked up without restarting the API. Scoring is one matrix
+product per batch: sigmoid(X @ coef.T + intercept).
+"""
+import os, uuid, asyncio, pathlib, threading
+import numpy as np
+
+CHECKPOINT_PATH = pathlib.Path(os.getenv("FL_CHECKPOINT_DIR", "checkpoints"))/"latest.npz"
+SCORING_BATCH = int(os.getenv("SCORING_BATCH", "10000"))
+FEATURES = ("rl_amt", "days_since", "gift_count")
+
+class Model:
+    def __init__(self, coef, intercept, round_number):
+        self.coef = np.asarray(coef, dtype=np.float64).reshape(1, -1)
+        self.intercept = np.asarray(intercept, dtype=np.float64).reshape(-1)
+        self.round = round_number
+
+    def score(self, X: np.ndarray) -> np.ndarray:
+        """Repeat-donor probability for each row of X"""
+        z = X @ self.coef.T + self.intercept
+        return 1.0 / (1.0 + np.exp(-np.clip(z[:, 0], -500, 500)))
+
+class ModelStore:
+    def __init__(self, path: pathlib.Path = CHECKPOINT_PATH):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._model = None
+        self._stamp = None
+
+    def _current_stamp(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self):
+        """Current model, reloaded if the checkpoint changed; None if there is none yet"""
+        stamp = self._current_stamp()
+        if stamp is None:
+            return None
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    with np.load(self.path) as data:
+                        model = Model(data["arr_0"], data["arr_1"], int(data["round"]))
+                    self._model, self._stamp = model, stamp
+                    print(f"Loaded scoring model from round {model.round}")
+        return self._model
+
+    async def get_async(self):
+        """get() for request handlers: a reload runs on a worker thread"""
+        stamp = self._current_stamp()
+        if stamp is None:
+            return None
+        if stamp != self._stamp:
+            return await asyncio.to_thread(self.get)
+        return self._model
+
+_STORE = ModelStore()
+
+def get_store() -> ModelStore:
+    return _STORE
+
+# Same columns as the <charity>_features views
+_FEATURES_SQL = """
+SELECT donor_hash, total_amount,
+       EXTRACT(EPOCH FROM (now() - last_gift_at))/86400,
+       gift_count
+FROM donor_features WHERE charity = %s
+"""
+
+def score_donors(conn, model: Model, charity: str, donors=None, batch_size: int = SCORING_BATCH):
+    """[(donor_hash, score)] for a charity's donors (all, or just `donors`)"""
+    sql, params = _FEATURES_SQL, [charity]
+    if donors is not None:
+        sql += " AND donor_hash = ANY(%s)"
+        params.append(list(donors))
+    scored = []
+    with conn.cursor(name=f"scoring_{uuid.uuid4().hex}") as cur:
+        cur.itersize = batch_size
+        cur.execute(sql + " ORDER BY donor_hash", params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            X = np.nan_to_num(np.array([row[1:] for row in rows], dtype=np.float64))
+            scored.extend(zip((row[0] for row in rows), model.score(X).tolist()))
+    return scored
@@ -0,0 +1,67 @@
+"""
+Accuracy against bytes on the wire for the FL compression modes.
+
+Runs federated averaging in-process over synthetic charity data (no server,
+no database) once per compression setting and reports the serialized
+parameter bytes per round and the final holdout accuracy.
+
+    python scripts/bench_compression.py [features] [clients] [rounds]
+"""
+import sys, pathlib
+import numpy as np
+from flwr.common import ndarrays_to_parameters
+from sklearn.linear_model import SGDClassifier
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent/"fl"))
+import compression
+
+FEATURES = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+ROUNDS = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+ROWS_PER_CLIENT = 2000
+CLASSES = np.array([0, 1])
+
+def synthetic(rng):
+    true_coef = rng.normal(size=FEATURES)
+    def sample(n):
+        X = rng.normal(size=(n, FEATURES))
+        y = (X @ true_coef + rng.normal(scale=0.5, size=n) > 0).astype(int)
+        return X, y
+    return [sample(ROWS_PER_CLIENT) for _ in range(CLIENTS)], sample(10000)
+
+def wire_bytes(ndarrays) -> int:
+    return sum(len(t) for t in ndarrays_to_parameters(ndarrays).tensors)
+
+def run(mode, delta, clients, holdout):
+    models = [SGDClassifier(loss="log_loss", random_state=i) for i in range(CLIENTS)]
+    global_model = [np.zeros((1, FEATURES)), np.zeros(1)]
+    sent = 0
+    for _ in range(ROUNDS):
+        payload = compression.encode(global_model, mode)
+        received = compression.decode(payload, mode)
+        sent += wire_bytes(payload) * CLIENTS
+        updates, weights = [], []
+        for model, (X, y) in zip(models, clients):
+            model.partial_fit(X[:1], y[:1], classes=CLASSES)   # allocate on first round
+            model.coef_, model.intercept_ = received[0].copy(), received[1].copy()
+            model.partial_fit(X, y, classes=CLASSES)
+            update = compression.encode([model.coef_, model.intercept_], mode, received if delta else None)
+            sent += wire_bytes(update)
+            updates.append(compression.decode(update, mode, received if delta else None))
+            weights.append(len(X))
+        total = sum(weights)
+        global_model = [sum(w * u[i] for u, w in zip(updates, weights)) / total for i in range(2)]
+    X, y = holdout
+    accuracy = float((((X @ global_model[0].T)[:, 0] + global_model[1][0] > 0) == y).mean())
+    return sent / ROUNDS, accuracy
+
+if __name__ == "__main__":
+    clients, holdout = synthetic(np.random.default_rng(0))
+    print(f"{FEATURES} features, {CLIENTS} clients, {ROUNDS} rounds")
+    print(f"{'mode':<10}{'delta':<7}{'bytes/round':>12}{'vs none':>9}{'accuracy':>10}")
+    baseline = None
+    for mode in compression.MODES:
+        for delta in (False, True):
+            per_round, accuracy = run(mode, delta, clients, holdout)
+            baseline = baseline or per_round
+            print(f"{mode:<10}{str(delta):<7}{per_round:>12.0f}{per_round / baseline:>8.0%}{accuracy:>10.4f}")
@@ -0,0 +1,45 @@
+"""
+Per-donation CPU cost of building a memo: the previous path (jsonschema.validate
+rebuilding the validator each call, three json.dumps) against edms.build.
+
+    python scripts/bench_memo.py [iterations]
+"""
+import sys, json, pathlib, timeit
+from datetime import datetime, timezone
+from hashlib import sha256
+import jsonschema
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+import edms
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+def legacy():
+    memo = {
+        "cid": "bench_cause",
+        "chr": "MEDA",
+        "amt": 25.0,
+        "cur": "RLUSD",
+        "ts": datetime.now(timezone.utc).isoformat(timespec="seconds")
+    }
+    memo["ph"] = sha256(json.dumps(memo, sort_keys=True).encode()).hexdigest()
+    jsonschema.validate(memo, edms.SCHEMA)
+    memo_hex = json.dumps(memo).encode().hex()
+    record = json.dumps({**memo, "tx": "0" * 64})
+    return memo_hex, record
+
+def current():
+    memo = edms.build("MEDA", "bench_cause", 25.0)
+    memo_hex = memo.hex
+    record = json.dumps({**memo.fields, "tx": "0" * 64})
+    return memo_hex, record
+
+def per_call_us(fn):
+    return min(timeit.repeat(fn, number=N, repeat=3)) / N * 1e6
+
+if __name__ == "__main__":
+    before, after = per_call_us(legacy), per_call_us(current)
+    print(f"iterations:      {N}")
+    print(f"before (legacy): {before:8.1f} us/donation")
+    print(f"after (edms):    {after:8.1f} us/donation")
+    print(f"speedup:         {before / after:8.1f}x")
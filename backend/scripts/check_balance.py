@@ -1,26 +1,26 @@
-import os
-from xrpl.clients import JsonRpcClient
-from xrpl.models.requests import AccountLines
+"""
+XRP and trustline balances of the platform's wallets, or of the given
+addresses, read concurrently at one validated ledger (see balances.py).
 
-USER_ADDRESS = os.getenv("USER_WALLET_ADDRESS", "rJMTFTr9d1MMXyMKJR844UbYeTCbsPVYQj")
-RLUSD_ISSUER = os.getenv("RLUSD_ISSUER", "rQhWct2fv4Vc4KRjRgMrxa8xPN9Zx9iLKV")
-XRPL_RPC = os.getenv("XRPL_RPC", "https://s.altnet.rippletest.net:51234")
+    python scripts/check_balance.py [address ...]
+"""
+import sys, asyncio, pathlib
 
-client = JsonRpcClient(XRPL_RPC)
-
-req = AccountLines(account=USER_ADDRESS, peer=RLUSD_ISSUER)
-res = client.request(req).result
-lines = res.get("lines", [])
-
-print(f"Address: {USER_ADDRESS}")
-print(f"Issuer:  {RLUSD_ISSUER}")
-if not lines:
-    print("No trustlines found with issuer")
-else:
-    for line in lines:
-        currency = line.get("currency")
-        balance = line.get("balance")
-        limit = line.get("limit")
-        print(f"Currency: {currency}  Balance: {balance}  Limit: {limit}")
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+import balances
 
+accounts = {address: address for address in sys.argv[1:]} or balances.watched_accounts()
+snapshot = asyncio.run(balances.fetch_balances(accounts))
 
+print(f"Validated ledger: {snapshot['ledger_index']}")
+for label, account in snapshot["accounts"].items():
+    print(f"\n{label}: {account['address']}")
+    if "error" in account:
+        print(f"  Error: {account['error']}")
+        continue
+    print(f"  XRP: {account['xrp']}  RLUSD: {account['rlusd']}")
+    if not account["lines"]:
+        print("  No trustlines")
+    for line in account["lines"]:
+        print(f"  Currency: {line['currency']}  Issuer: {line['issuer']}  "
+              f"Balance: {line['balance']}  Limit: {line['limit']}")
@@ -1,18 +1,19 @@
--- one view per charity; join on ph hash look-up table
+-- one row per donor and charity, from the donor_features store
+-- (maintained by triggers, see migrations/007_donor_features.sql)
 CREATE OR REPLACE VIEW meda_features AS
 SELECT
-  data->>'ph'   AS donor_hash,
-  (data->>'amt')::numeric   AS rl_amt,
-  EXTRACT(EPOCH FROM (now() - (data->>'ts')::timestamptz))/86400 AS days_since,
-  COUNT(*) OVER (PARTITION BY data->>'ph') AS gift_count
-FROM donations
-WHERE data->>'chr' = 'MEDA';
+  donor_hash,
+  total_amount AS rl_amt,
+  EXTRACT(EPOCH FROM (now() - last_gift_at))/86400 AS days_since,
+  gift_count
+FROM donor_features
+WHERE charity = 'MEDA';
 
 CREATE OR REPLACE VIEW tara_features AS
 SELECT
-  data->>'ph' AS donor_hash,
-  (data->>'amt')::numeric   AS rl_amt,
-  EXTRACT(EPOCH FROM (now() - (data->>'ts')::timestamptz))/86400 AS days_since,
-  COUNT(*) OVER (PARTITION BY data->>'ph') AS gift_count
-FROM donations
-WHERE data->>'chr' = 'TARA'; 
\ No newline at end of file
+  donor_hash,
+  total_amount AS rl_amt,
+  EXTRACT(EPOCH FROM (now() - last_gift_at))/86400 AS days_since,
+  gift_count
+FROM donor_features
+WHERE charity = 'TARA';
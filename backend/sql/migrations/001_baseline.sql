@@ -0,0 +1,54 @@
+-- Schema as originally created by seed.sql, so databases initialised
+-- before the migration runner existed end up in the same state
+
+-- Create extensions
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+
+-- Create tables
+CREATE TABLE IF NOT EXISTS donations(
+  tx TEXT PRIMARY KEY,
+  data JSONB
+);
+
+-- Donations accepted by the API but not yet submitted to XRPL (see outbox.py)
+CREATE TABLE IF NOT EXISTS donation_outbox(
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  status TEXT NOT NULL DEFAULT 'queued',   -- queued | processing | done | failed
+  charity TEXT NOT NULL,
+  amount NUMERIC NOT NULL,
+  memo JSONB NOT NULL,
+  extra JSONB NOT NULL DEFAULT '{}',      -- merged into the donations record
+  tx TEXT,
+  tx_blob TEXT,
+  last_ledger_sequence BIGINT,
+  attempts INT NOT NULL DEFAULT 0,
+  last_error TEXT,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_until TIMESTAMPTZ,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS donation_outbox_due
+  ON donation_outbox (next_attempt_at)
+  WHERE status IN ('queued', 'processing');
+
+-- Create feature views for federated learning
+-- one view per charity; join on ph hash look-up table
+CREATE OR REPLACE VIEW meda_features AS
+SELECT
+  data->>'ph'   AS donor_hash,
+  (data->>'amt')::numeric   AS rl_amt,
+  EXTRACT(EPOCH FROM (now() - (data->>'ts')::timestamptz))/86400 AS days_since,
+  COUNT(*) OVER (PARTITION BY data->>'ph') AS gift_count
+FROM donations
+WHERE data->>'chr' = 'MEDA';
+
+CREATE OR REPLACE VIEW tara_features AS
+SELECT
+  data->>'ph' AS donor_hash,
+  (data->>'amt')::numeric   AS rl_amt,
+  EXTRACT(EPOCH FROM (now() - (data->>'ts')::timestamptz))/86400 AS days_since,
+  COUNT(*) OVER (PARTITION BY data->>'ph') AS gift_count
+FROM donations
+WHERE data->>'chr' = 'TARA';
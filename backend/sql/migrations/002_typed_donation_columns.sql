@@ -0,0 +1,55 @@
+-- Typed, indexable columns extracted from the donation memo so queries and
+-- views stop parsing JSONB on every row. Adding the generated columns
+-- rewrites the table, which fills them in for existing rows; donated_at is
+-- maintained by a trigger (text -> timestamptz is not immutable, so it
+-- cannot be a generated column) and backfilled by `python migrate.py backfill`.
+
+ALTER TABLE donations
+  ADD COLUMN IF NOT EXISTS charity TEXT GENERATED ALWAYS AS (data->>'chr') STORED,
+  ADD COLUMN IF NOT EXISTS cause_id TEXT GENERATED ALWAYS AS (data->>'cid') STORED,
+  ADD COLUMN IF NOT EXISTS donor_hash TEXT GENERATED ALWAYS AS (data->>'ph') STORED,
+  ADD COLUMN IF NOT EXISTS amount NUMERIC GENERATED ALWAYS AS ((data->>'amt')::numeric) STORED,
+  ADD COLUMN IF NOT EXISTS donated_at TIMESTAMPTZ;
+
+-- NULL instead of an error for a missing or malformed timestamp
+CREATE OR REPLACE FUNCTION donation_ts(data JSONB) RETURNS TIMESTAMPTZ AS $$
+BEGIN
+  RETURN (data->>'ts')::timestamptz;
+EXCEPTION WHEN others THEN
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION donations_set_donated_at() RETURNS TRIGGER AS $$
+BEGIN
+  NEW.donated_at := donation_ts(NEW.data);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS donations_donated_at ON donations;
+CREATE TRIGGER donations_donated_at
+  BEFORE INSERT OR UPDATE OF data ON donations
+  FOR EACH ROW EXECUTE FUNCTION donations_set_donated_at();
+
+CREATE INDEX IF NOT EXISTS donations_charity_donated_at ON donations (charity, donated_at);
+CREATE INDEX IF NOT EXISTS donations_charity_donor ON donations (charity, donor_hash);
+CREATE INDEX IF NOT EXISTS donations_cause_id ON donations (cause_id);
+
+CREATE OR REPLACE VIEW meda_features AS
+SELECT
+  donor_hash,
+  amount AS rl_amt,
+  EXTRACT(EPOCH FROM (now() - donated_at))/86400 AS days_since,
+  COUNT(*) OVER (PARTITION BY donor_hash) AS gift_count
+FROM donations
+WHERE charity = 'MEDA';
+
+CREATE OR REPLACE VIEW tara_features AS
+SELECT
+  donor_hash,
+  amount AS rl_amt,
+  EXTRACT(EPOCH FROM (now() - donated_at))/86400 AS days_since,
+  COUNT(*) OVER (PARTITION BY donor_hash) AS gift_count
+FROM donations
+WHERE charity = 'TARA';
@@ -0,0 +1,66 @@
+-- Running per-charity totals kept in step with donations by statement-level
+-- triggers, so /totals reads one row per charity instead of summing the
+-- whole table. hwm is a high-water mark that changes on every update and
+-- lets the API tell whether its cached copy is still current. Rows are
+-- always locked in charity order so concurrent batches cannot deadlock.
+
+CREATE SEQUENCE IF NOT EXISTS donation_totals_hwm;
+
+CREATE TABLE IF NOT EXISTS donation_totals(
+  charity TEXT PRIMARY KEY,
+  total NUMERIC NOT NULL DEFAULT 0,
+  gift_count BIGINT NOT NULL DEFAULT 0,
+  hwm BIGINT NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION donation_totals_add() RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO donation_totals AS t (charity, total, gift_count, hwm)
+  SELECT charity, COALESCE(SUM(amount), 0), COUNT(*), nextval('donation_totals_hwm')
+  FROM new_rows WHERE charity IS NOT NULL GROUP BY charity ORDER BY charity
+  ON CONFLICT (charity) DO UPDATE SET
+    total = t.total + EXCLUDED.total,
+    gift_count = t.gift_count + EXCLUDED.gift_count,
+    hwm = EXCLUDED.hwm;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION donation_totals_remove() RETURNS TRIGGER AS $$
+BEGIN
+  -- UPDATE ... FROM follows the join plan, so take the row locks first
+  PERFORM 1 FROM donation_totals
+  WHERE charity IN (SELECT charity FROM old_rows)
+  ORDER BY charity FOR UPDATE;
+  UPDATE donation_totals t SET
+    total = t.total - d.total,
+    gift_count = t.gift_count - d.gift_count,
+    hwm = nextval('donation_totals_hwm')
+  FROM (
+    SELECT charity, COALESCE(SUM(amount), 0) AS total, COUNT(*) AS gift_count
+    FROM old_rows WHERE charity IS NOT NULL GROUP BY charity
+  ) d
+  WHERE t.charity = d.charity;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Block writers while the triggers are installed and the totals seeded
+LOCK TABLE donations IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS donations_totals_insert ON donations;
+CREATE TRIGGER donations_totals_insert
+  AFTER INSERT ON donations
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION donation_totals_add();
+
+DROP TRIGGER IF EXISTS donations_totals_delete ON donations;
+CREATE TRIGGER donations_totals_delete
+  AFTER DELETE ON donations
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION donation_totals_remove();
+
+TRUNCATE donation_totals;
+INSERT INTO donation_totals (charity, total, gift_count, hwm)
+SELECT charity, COALESCE(SUM(amount), 0), COUNT(*), nextval('donation_totals_hwm')
+FROM donations WHERE charity IS NOT NULL GROUP BY charity;
@@ -0,0 +1,6 @@
+-- Keyset pagination for /scores walks (charity, donor_hash, tx); this index
+-- serves that order and also covers the (charity, donor_hash) lookups the
+-- narrower index from 002 was added for.
+
+CREATE INDEX IF NOT EXISTS donations_charity_donor_tx ON donations (charity, donor_hash, tx);
+DROP INDEX IF EXISTS donations_charity_donor;
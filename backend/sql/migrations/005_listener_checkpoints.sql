@@ -0,0 +1,10 @@
+-- Per-address read position of the donation listener. ledger_index is the
+-- last validated ledger whose transactions for the address have been
+-- recorded; the listener resumes from it (inclusive) after a restart.
+-- Written by batch_writer in the same transaction as the donations.
+
+CREATE TABLE IF NOT EXISTS listener_checkpoints(
+  address TEXT PRIMARY KEY,
+  ledger_index BIGINT NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
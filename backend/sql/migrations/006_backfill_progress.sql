@@ -0,0 +1,11 @@
+-- Work units of `listener.py backfill`: one row per address and ledger
+-- range. done_at is set once every AccountTx page of the range has been
+-- recorded, so a re-run with the same range skips finished chunks.
+
+CREATE TABLE IF NOT EXISTS backfill_progress(
+  address TEXT NOT NULL,
+  ledger_min BIGINT NOT NULL,
+  ledger_max BIGINT NOT NULL,
+  done_at TIMESTAMPTZ,
+  PRIMARY KEY (address, ledger_min, ledger_max)
+);
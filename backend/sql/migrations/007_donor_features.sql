@@ -0,0 +1,113 @@
+-- Feature store: one row per (charity, donor) kept current by statement-level
+-- triggers on donations, so feature reads no longer aggregate the whole
+-- donations table. days_since is derived from last_gift_at when read.
+-- `SELECT refresh_donor_features()` (python migrate.py refresh-features)
+-- rebuilds the table from donations should it ever drift.
+
+CREATE TABLE IF NOT EXISTS donor_features(
+  charity TEXT NOT NULL,
+  donor_hash TEXT NOT NULL,
+  gift_count BIGINT NOT NULL DEFAULT 0,
+  total_amount NUMERIC NOT NULL DEFAULT 0,
+  last_gift_at TIMESTAMPTZ,
+  PRIMARY KEY (charity, donor_hash)
+);
+
+CREATE INDEX IF NOT EXISTS donor_features_charity_last_gift ON donor_features (charity, last_gift_at);
+
+CREATE OR REPLACE FUNCTION donor_features_add() RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO donor_features AS f (charity, donor_hash, gift_count, total_amount, last_gift_at)
+  SELECT charity, donor_hash, COUNT(*), COALESCE(SUM(amount), 0), max(donated_at)
+  FROM new_rows WHERE charity IS NOT NULL AND donor_hash IS NOT NULL
+  GROUP BY charity, donor_hash ORDER BY charity, donor_hash
+  ON CONFLICT (charity, donor_hash) DO UPDATE SET
+    gift_count = f.gift_count + EXCLUDED.gift_count,
+    total_amount = f.total_amount + EXCLUDED.total_amount,
+    last_gift_at = GREATEST(f.last_gift_at, EXCLUDED.last_gift_at);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- last_gift_at cannot be decremented, so affected donors are recomputed.
+-- Their rows are locked first, in key order, so concurrent batches cannot
+-- deadlock (UPDATE ... FROM follows the join plan).
+CREATE OR REPLACE FUNCTION donor_features_remove() RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM 1 FROM donor_features f
+  WHERE (f.charity, f.donor_hash) IN (SELECT charity, donor_hash FROM old_rows)
+  ORDER BY f.charity, f.donor_hash FOR UPDATE;
+  UPDATE donor_features f SET
+    gift_count = s.gift_count,
+    total_amount = s.total_amount,
+    last_gift_at = s.last_gift_at
+  FROM (
+    SELECT o.charity, o.donor_hash,
+           COUNT(d.tx) AS gift_count, COALESCE(SUM(d.amount), 0) AS total_amount,
+           max(d.donated_at) AS last_gift_at
+    FROM (SELECT DISTINCT charity, donor_hash FROM old_rows
+          WHERE charity IS NOT NULL AND donor_hash IS NOT NULL) o
+    LEFT JOIN donations d ON d.charity = o.charity AND d.donor_hash = o.donor_hash
+    GROUP BY o.charity, o.donor_hash
+  ) s
+  WHERE f.charity = s.charity AND f.donor_hash = s.donor_hash;
+  DELETE FROM donor_features f
+  WHERE f.gift_count = 0
+    AND (f.charity, f.donor_hash) IN (SELECT charity, donor_hash FROM old_rows);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION refresh_donor_features() RETURNS BIGINT AS $$
+DECLARE
+  donors BIGINT;
+BEGIN
+  LOCK TABLE donations IN SHARE MODE;
+  DELETE FROM donor_features;
+  INSERT INTO donor_features (charity, donor_hash, gift_count, total_amount, last_gift_at)
+  SELECT charity, donor_hash, COUNT(*), COALESCE(SUM(amount), 0), max(donated_at)
+  FROM donations WHERE charity IS NOT NULL AND donor_hash IS NOT NULL
+  GROUP BY charity, donor_hash;
+  GET DIAGNOSTICS donors = ROW_COUNT;
+  RETURN donors;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Block writers while the triggers are installed and the table seeded
+LOCK TABLE donations IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS donations_features_insert ON donations;
+CREATE TRIGGER donations_features_insert
+  AFTER INSERT ON donations
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION donor_features_add();
+
+DROP TRIGGER IF EXISTS donations_features_delete ON donations;
+CREATE TRIGGER donations_features_delete
+  AFTER DELETE ON donations
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION donor_features_remove();
+
+SELECT refresh_donor_features();
+
+-- The views now return one row per donor; rl_amt is the donor's total
+DROP VIEW IF EXISTS meda_features;
+DROP VIEW IF EXISTS tara_features;
+
+CREATE VIEW meda_features AS
+SELECT
+  donor_hash,
+  total_amount AS rl_amt,
+  EXTRACT(EPOCH FROM (now() - last_gift_at))/86400 AS days_since,
+  gift_count
+FROM donor_features
+WHERE charity = 'MEDA';
+
+CREATE VIEW tara_features AS
+SELECT
+  donor_hash,
+  total_amount AS rl_amt,
+  EXTRACT(EPOCH FROM (now() - last_gift_at))/86400 AS days_since,
+  gift_count
+FROM donor_features
+WHERE charity = 'TARA';
@@ -0,0 +1,8 @@
+-- Next Sequence to hand out per sending account, shared by every process
+-- that signs for it (the API and each outbox worker). NULL means the
+-- counter must be re-read from account_info before the next allocation.
+
+CREATE TABLE IF NOT EXISTS xrpl_sequences(
+  address TEXT PRIMARY KEY,
+  next_sequence BIGINT
+);
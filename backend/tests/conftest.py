@@ -0,0 +1,11 @@
+"""
+Unit tests that need neither a database nor an XRPL server.
+
+    cd backend && python -m pytest -q tests
+"""
+import sys, pathlib
+
+BACKEND = pathlib.Path(__file__).resolve().parent.parent
+for path in (BACKEND, BACKEND / "fl"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,42 @@
+import asyncio
+import backfill
+
+class Response:
+    def __init__(self, result, ok=True):
+        self.result = result
+        self.ok = ok
+
+    def is_successful(self):
+        return self.ok
+
+class Client:
+    """Oldest transaction per address, in the API v1 shape xrpl-py 2.x gets"""
+
+    def __init__(self, first):
+        self.first = first
+
+    async def request(self, request):
+        ledger_index = self.first.get(request.account)
+        if ledger_index is None:
+            return Response({"transactions": []})
+        return Response({"transactions": [
+            {"tx": {"hash": "A" * 64, "ledger_index": ledger_index}, "meta": {}, "validated": True}
+        ]})
+
+def test_first_ledger_reads_v1_entries():
+    client = Client({"rOne": 120})
+    assert asyncio.run(backfill.first_ledger(client, "rOne")) == 120
+    assert asyncio.run(backfill.first_ledger(client, "rNone")) is None
+
+def test_chunks_start_at_each_address_first_ledger():
+    client = Client({"rOne": 100, "rTwo": 240})
+    chunks = asyncio.run(backfill.build_chunks(client, ["rOne", "rTwo", "rNone"], None, 300, 100))
+    assert chunks == [
+        ("rOne", 100, 199), ("rOne", 200, 299), ("rOne", 300, 300),
+        ("rTwo", 240, 300),
+    ]
+
+def test_explicit_start_skips_the_lookup():
+    client = Client({})
+    chunks = asyncio.run(backfill.build_chunks(client, ["rOne"], 50, 60, 100))
+    assert chunks == [("rOne", 50, 60)]
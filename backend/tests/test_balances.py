@@ -0,0 +1,106 @@
+import asyncio
+from decimal import Decimal
+import pytest
+import balances
+
+ACCOUNTS = {"MEDA": "rMeda", "TARA": "rTara"}
+
+class Ledger:
+    """Fake XRPL side: a validated ledger index and a count of refreshes"""
+
+    def __init__(self):
+        self.index = 10
+        self.checks = 0
+        self.fetches = 0
+        self.accounts = dict(ACCOUNTS)
+
+    async def latest(self, client):
+        self.checks += 1
+        return self.index
+
+    async def fetch(self, accounts, client, ledger_index):
+        self.fetches += 1
+        await asyncio.sleep(0.01)
+        return {"ledger_index": ledger_index,
+                "accounts": {label: {"address": address} for label, address in accounts.items()}}
+
+@pytest.fixture
+def ledger(monkeypatch):
+    ledger = Ledger()
+    monkeypatch.setattr(balances, "get_latest_validated_ledger_sequence", ledger.latest)
+    monkeypatch.setattr(balances, "fetch_balances", ledger.fetch)
+    monkeypatch.setattr(balances, "watched_accounts", lambda: dict(ledger.accounts))
+    return ledger
+
+def test_concurrent_callers_share_one_refresh(ledger):
+    cache = balances.BalanceCache(ttl=60)
+
+    async def many():
+        return await asyncio.gather(*(cache.get() for _ in range(20)))
+
+    results = asyncio.run(many())
+    assert ledger.fetches == 1 and ledger.checks == 1
+    assert all(result is results[0] for result in results)
+
+def test_fresh_snapshot_skips_the_ledger_check(ledger):
+    cache = balances.BalanceCache(ttl=60)
+    asyncio.run(cache.get())
+    asyncio.run(cache.get())
+    assert ledger.checks == 1 and ledger.fetches == 1
+
+def test_stale_snapshot_is_refetched_only_after_a_new_ledger(ledger):
+    cache = balances.BalanceCache(ttl=0)
+    first = asyncio.run(cache.get())
+    assert asyncio.run(cache.get()) is first
+    assert ledger.checks == 2 and ledger.fetches == 1
+    ledger.index = 11
+    assert asyncio.run(cache.get())["ledger_index"] == 11
+    assert ledger.fetches == 2
+
+def test_new_account_forces_a_refetch(ledger):
+    cache = balances.BalanceCache(ttl=0)
+    asyncio.run(cache.get())
+    ledger.accounts["CHARITY_1"] = "rNew"
+    assert "CHARITY_1" in asyncio.run(cache.get())["accounts"]
+    assert ledger.fetches == 2
+
+def test_invalidate(ledger):
+    cache = balances.BalanceCache(ttl=60)
+    asyncio.run(cache.get())
+    cache.invalidate()
+    asyncio.run(cache.get())
+    assert ledger.fetches == 2
+
+class Response:
+    def __init__(self, result, ok=True):
+        self.result = result
+        self.ok = ok
+
+    def is_successful(self):
+        return self.ok
+
+class Client:
+    """account_info plus two AccountLines pages joined by a marker"""
+
+    def __init__(self):
+        self.pages = [
+            {"lines": [self.line(balances.RLUSD_HEX, balances.RLUSD_ISSUER, "0.1")], "marker": "m"},
+            {"lines": [self.line("RLUSD", balances.RLUSD_ISSUER, "0.2"),
+                       self.line(balances.RLUSD_HEX, "rSomeoneElse", "50"),
+                       self.line("USD", balances.RLUSD_ISSUER, "7")]},
+        ]
+
+    @staticmethod
+    def line(currency, issuer, balance):
+        return {"currency": currency, "account": issuer, "balance": balance, "limit": "1000"}
+
+    async def request(self, request):
+        if request.method == "account_info":
+            return Response({"account_data": {"Balance": "12500000"}})
+        return Response(self.pages.pop(0))
+
+def test_fetch_account_sums_rlusd_exactly():
+    account = asyncio.run(balances.fetch_account(Client(), "rMeda", 10))
+    assert Decimal(account["xrp"]) == Decimal("12.5")
+    assert account["rlusd"] == "0.3"
+    assert len(account["lines"]) == 4
@@ -0,0 +1,76 @@
+import time, asyncio, concurrent.futures
+import pytest
+import batch_writer
+
+class Writer(batch_writer.BatchWriter):
+    """BatchWriter whose transaction is a list; a page holding tx "bad" fails"""
+
+    def __init__(self, delay=0.0, **kwargs):
+        super().__init__(max_delay=0.01, **kwargs)
+        self.delay = delay
+        self.committed = []
+        self.calls = 0
+
+    def _write(self, batch):
+        self.calls += 1
+        time.sleep(self.delay)
+        rows = [row for item_rows, _, _ in batch for row in item_rows]
+        if any(tx == "bad" for tx, _ in rows):
+            raise ValueError("bad row")
+        self.committed += [tx for tx, _ in rows]
+        return len(rows)
+
+def item(*txs):
+    return ([(tx, "{}") for tx in txs], [], concurrent.futures.Future())
+
+def test_failing_page_only_fails_its_caller():
+    writer = Writer()
+    batch = [item("a", "b"), item("bad"), item("c")]
+    writer._flush(batch)
+    assert batch[0][2].result() is None and batch[2][2].result() is None
+    with pytest.raises(ValueError):
+        batch[1][2].result()
+    assert writer.committed == ["a", "b", "c"]
+    assert writer.stats["failed_batches"] == 2
+
+def test_cancelled_page_is_dropped():
+    writer = Writer()
+    batch = [item("a"), item("b")]
+    batch[0][2].cancel()
+    writer._flush(batch)
+    assert writer.committed == ["b"]
+    assert batch[1][2].result() is None
+
+def test_fully_cancelled_batch_is_not_written():
+    writer = Writer()
+    batch = [item("a")]
+    batch[0][2].cancel()
+    writer._flush(batch)
+    assert writer.calls == 0
+
+def test_caller_timing_out_mid_write_does_not_kill_the_writer():
+    writer = Writer(delay=0.2).start()
+    try:
+        async def run():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(writer.write_async({"tx": "slow"}), 0.05)
+            with pytest.raises(asyncio.TimeoutError):
+                # Cancelled while still queued behind the slow write
+                await asyncio.wait_for(writer.write_async({"tx": "dropped"}), 0.01)
+            await asyncio.wait_for(writer.write_async({"tx": "after"}), 5)
+
+        asyncio.run(run())
+        assert writer._thread.is_alive()
+        assert writer.committed == ["slow", "after"]
+    finally:
+        writer.close()
+
+def test_write_honours_timeout():
+    writer = Writer(delay=0.3).start()
+    try:
+        started = time.monotonic()
+        with pytest.raises(concurrent.futures.TimeoutError):
+            writer.write({"tx": "a"}, timeout=0.05)
+        assert time.monotonic() - started < 0.25
+    finally:
+        writer.close()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import compression
+
+def tensors():
+    rng = np.random.default_rng(0)
+    return [rng.normal(size=(4, 3)), rng.normal(size=3), np.zeros((2, 2)), np.array(1.5)]
+
+def test_none_is_lossless():
+    arrays = tensors()
+    for a, b in zip(compression.decode(compression.encode(arrays, "none"), "none"), arrays):
+        np.testing.assert_array_equal(a, b)
+
+@pytest.mark.parametrize("mode, tolerance", [("float16", 1e-3), ("int8", 1 / 127)])
+def test_round_trip_keeps_shapes_within_tolerance(mode, tolerance):
+    arrays = tensors()
+    decoded = compression.decode(compression.encode(arrays, mode), mode)
+    assert [a.shape for a in decoded] == [a.shape for a in arrays]
+    for a, b in zip(decoded, arrays):
+        assert a.dtype == np.float64
+        np.testing.assert_allclose(a, b, atol=tolerance * max(1.0, np.abs(b).max()))
+
+def test_packed_modes_send_one_flat_array():
+    arrays = tensors()
+    flat, layout = compression.encode(arrays, "float16")
+    assert flat.dtype == np.float16 and flat.size == sum(a.size for a in arrays)
+    q, scales, _ = compression.encode(arrays, "int8")
+    assert q.dtype == np.int8 and len(scales) == len(arrays)
+
+def test_float16_clips_out_of_range_values():
+    flat, _ = compression.encode([np.array([1e6, -1e6])], "float16")
+    assert np.isfinite(flat).all()
+
+@pytest.mark.parametrize("mode", compression.MODES)
+def test_delta_round_trip_against_reference(mode):
+    reference = tensors()
+    arrays = [r + 0.01 for r in reference]
+    decoded = compression.decode(compression.encode(arrays, mode, reference), mode, reference)
+    for a, b in zip(decoded, arrays):
+        np.testing.assert_allclose(a, b, atol=1e-4)
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        compression.encode(tensors(), "int4")
+
+def test_config_round_trip():
+    assert compression.from_config(compression.config("int8", True)) == ("int8", True)
+    assert compression.from_config({}) == ("none", False)
@@ -0,0 +1,38 @@
+import json
+from hashlib import sha256
+import jsonschema
+import pytest
+import edms
+
+TS = "2025-01-01T00:00:00+00:00"
+
+def test_build_hashes_the_canonical_fields():
+    memo = edms.build("MEDA", "cause-1", 12.5, TS)
+    body = {k: v for k, v in memo.fields.items() if k != "ph"}
+    assert memo.fields["ph"] == sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()
+    assert json.loads(memo.json) == memo.fields
+
+def test_encode_reproduces_build():
+    memo = edms.build("TARA", "cause-2", 3, TS)
+    again = edms.encode(json.loads(memo.json))
+    assert again.json == memo.json
+    assert again.hex == memo.hex
+
+def test_decode_round_trip():
+    memo = edms.build("MEDA", "cause-3", 1.25, TS)
+    assert edms.decode(memo.hex) == memo.fields
+
+@pytest.mark.parametrize("memo_hex", ["zz", "00ff", b"[1, 2]".hex(), b"plain text".hex()])
+def test_decode_rejects_non_objects(memo_hex):
+    assert edms.decode(memo_hex) is None
+
+def test_build_validates():
+    with pytest.raises(jsonschema.ValidationError):
+        edms.build("MEDA", "cause-4", "lots", TS)
+
+def test_validate_many_reports_per_memo():
+    good = edms.build("MEDA", "cause-5", 2, TS).fields
+    results = edms.validate_many([good, None, {"cid": "x"}])
+    assert results[0] is None
+    assert results[1] == "not a JSON object"
+    assert isinstance(results[2], str)
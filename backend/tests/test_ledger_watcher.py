@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from xrpl.models.transactions import Payment
+from xrpl.transaction import sign, XRPLReliableSubmissionException
+from xrpl.wallet import Wallet
+import ledger_watcher
+from ledger_watcher import LedgerWatcher, TransactionExpired, TransactionRejected
+
+WALLET = Wallet.from_seed("sEdTM1uX8pu2do5XvTnutH6HsouMaM2")
+
+def signed_payment():
+    return sign(Payment(account=WALLET.classic_address, destination="rPT1Sjq2YGrBMTttX4GZHjKu9dyfzbpAYe",
+                        amount="1", sequence=5, fee="12", last_ledger_sequence=110), WALLET)
+
+class Response:
+    def __init__(self, result, ok=True):
+        self.result = result
+        self.ok = ok
+
+    def is_successful(self):
+        return self.ok
+
+def validated(tx_hash, code="tesSUCCESS"):
+    return {"hash": tx_hash, "validated": True, "meta": {"TransactionResult": code}}
+
+@pytest.fixture
+def watcher(monkeypatch):
+    """Unstarted watcher; tests resolve its entries by hand"""
+    watcher = LedgerWatcher()
+    monkeypatch.setattr(ledger_watcher, "get_watcher", lambda: watcher)
+    return watcher
+
+def on_submit(monkeypatch, engine_result, then=None):
+    """Fake submit answering engine_result, then calling then(tx_hash)"""
+
+    async def submit_async(signed, client):
+        if then:
+            asyncio.get_running_loop().call_soon(then, signed.get_hash())
+        return Response({"engine_result": engine_result, "engine_result_message": "msg"})
+
+    monkeypatch.setattr(ledger_watcher, "submit_async", submit_async)
+
+@pytest.mark.parametrize("prelim", ["temBAD_FEE", "tefPAST_SEQ", "telINSUF_FEE_P"])
+def test_prelim_rejection_fails_at_once(monkeypatch, watcher, prelim):
+    on_submit(monkeypatch, prelim)
+    with pytest.raises(TransactionRejected) as exc:
+        asyncio.run(ledger_watcher.submit_and_wait_async(signed_payment(), None, timeout=5))
+    assert exc.value.engine_result == prelim
+    assert watcher.pending_count() == 0
+
+@pytest.mark.parametrize("prelim", ["tesSUCCESS", "tefALREADY", "terQUEUED"])
+def test_accepted_or_already_known_waits_for_validation(monkeypatch, watcher, prelim):
+    on_submit(monkeypatch, prelim, lambda h: watcher._resolve(h, result=validated(h)))
+    signed = signed_payment()
+    result = asyncio.run(ledger_watcher.submit_and_wait_async(signed, None, timeout=5))
+    assert result["hash"] == signed.get_hash()
+
+def test_validated_failure_raises(monkeypatch, watcher):
+    on_submit(monkeypatch, "tecPATH_DRY", lambda h: watcher._resolve(h, result=validated(h, "tecPATH_DRY")))
+    with pytest.raises(XRPLReliableSubmissionException, match="tecPATH_DRY"):
+        asyncio.run(ledger_watcher.submit_and_wait_async(signed_payment(), None, timeout=5))
+
+def test_expiry_is_reported(monkeypatch, watcher):
+    on_submit(monkeypatch, "tesSUCCESS", lambda h: watcher._resolve(h, error=TransactionExpired(h)))
+    with pytest.raises(TransactionExpired):
+        asyncio.run(ledger_watcher.submit_and_wait_async(signed_payment(), None, timeout=5))
+
+def test_timeout_forgets_the_transaction(monkeypatch, watcher):
+    on_submit(monkeypatch, "tesSUCCESS")
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(ledger_watcher.submit_and_wait_async(signed_payment(), None, timeout=0.01))
+    assert watcher.pending_count() == 0
+
+def test_sync_submit_and_wait_shares_the_rules(monkeypatch, watcher):
+    monkeypatch.setattr(ledger_watcher, "submit",
+                        lambda signed, client: Response({"engine_result": "telCAN_NOT_QUEUE"}))
+    with pytest.raises(TransactionRejected):
+        ledger_watcher.submit_and_wait(signed_payment(), None, timeout=1)
+    assert watcher.pending_count() == 0
+
+    def submit(signed, client):
+        watcher._resolve(signed.get_hash(), result=validated(signed.get_hash()))
+        return Response({"engine_result": "tefALREADY"})
+
+    monkeypatch.setattr(ledger_watcher, "submit", submit)
+    assert ledger_watcher.submit_and_wait(signed_payment(), None, timeout=1).is_successful()
+
+class LedgerClient:
+    """Tx lookups never find the transaction"""
+
+    async def request(self, request):
+        return Response({"error": "txnNotFound"}, ok=False)
+
+def test_passed_last_ledger_sequence_expires_entry(watcher):
+    future = watcher.watch("H" * 64, 110)
+    asyncio.run(watcher._expire(LedgerClient(), 110))
+    assert not future.done()
+    asyncio.run(watcher._expire(LedgerClient(), 111))
+    with pytest.raises(TransactionExpired):
+        future.result(0)
+    assert watcher.pending_count() == 0
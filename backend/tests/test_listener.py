@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+import edms, listener
+
+ADDRESS = "rCharity"
+
+class Response:
+    def __init__(self, result, ok=True):
+        self.result = result
+        self.ok = ok
+
+    def is_successful(self):
+        return self.ok
+
+def v1_entry(tx_hash, ledger_index, memo=None):
+    """AccountTx entry as API v1 (xrpl-py 2.x) returns it"""
+    tx = {"hash": tx_hash, "ledger_index": ledger_index, "Account": "rDonor", "Destination": ADDRESS}
+    if memo is not None:
+        tx["Memos"] = [{"Memo": {"MemoData": memo.hex}}]
+    return {"tx": tx, "meta": {}, "validated": True}
+
+def v2_entry(tx_hash, ledger_index):
+    return {"tx_json": {"Account": "rDonor"}, "hash": tx_hash, "ledger_index": ledger_index,
+            "meta": {}, "validated": True}
+
+class Client:
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.markers = []
+
+    async def request(self, request):
+        self.markers.append(request.marker)
+        return Response(self.pages.pop(0))
+
+@pytest.fixture
+def writes(monkeypatch):
+    log = []
+
+    async def insert_many_async(rows, checkpoints=()):
+        log.append((rows, list(checkpoints)))
+
+    monkeypatch.setattr(listener, "insert_many_async", insert_many_async)
+    return log
+
+def test_tx_ledger_index_reads_v1_and_v2():
+    assert listener.tx_ledger_index(v1_entry("A", 12)) == 12
+    assert listener.tx_ledger_index(v2_entry("A", "13")) == 13
+
+def test_paginated_catch_up_checkpoints_each_page(writes):
+    memo = edms.build("MEDA", "cause-1", 5, "2025-01-01T00:00:00+00:00")
+    client = Client([
+        {"transactions": [v1_entry("A" * 64, 101), v1_entry("B" * 64, 104, memo)], "marker": "m1"},
+        {"transactions": [v1_entry("C" * 64, 104)], "marker": "m2"},
+        {"transactions": [v1_entry("D" * 64, 150)]},
+    ])
+    state = listener.AddressState(ADDRESS, "MEDA")
+    state.ledger = 100
+    asyncio.run(listener.catch_up(client, ADDRESS, 100, 200, state))
+    assert client.markers == [None, "m1", "m2"]
+    # Mid-range pages resume inclusively from their last ledger; the last page covers the range
+    assert [checkpoints for _, checkpoints in writes] == [[(ADDRESS, 104)], [(ADDRESS, 104)], [(ADDRESS, 200)]]
+    assert writes[0][0] == [("B" * 64, memo.fields)]
+    assert state.ledger == 200
+
+def test_unfunded_account_is_checkpointed_at_the_target(writes):
+    class Unfunded:
+        async def request(self, request):
+            return Response({"error": "actNotFound"}, ok=False)
+
+    asyncio.run(listener.catch_up(Unfunded(), ADDRESS, 100, 200))
+    assert writes == [([], [(ADDRESS, 200)])]
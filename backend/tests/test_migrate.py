@@ -0,0 +1,18 @@
+import migrate
+
+def run_up(monkeypatch, applied):
+    backfills = []
+    monkeypatch.setattr(migrate, "migrate", lambda: list(applied))
+    monkeypatch.setattr(migrate, "backfill", lambda: backfills.append(True))
+    migrate.up()
+    return len(backfills)
+
+def test_up_backfills_in_the_run_that_adds_donated_at(monkeypatch):
+    assert run_up(monkeypatch, ["001_baseline", migrate.BACKFILL_MIGRATION, "003_donation_totals"]) == 1
+
+def test_up_skips_the_backfill_once_002_is_applied(monkeypatch):
+    assert run_up(monkeypatch, []) == 0
+    assert run_up(monkeypatch, ["008_xrpl_sequences"]) == 0
+
+def test_backfill_migration_exists():
+    assert (migrate.MIGRATIONS_DIR/f"{migrate.BACKFILL_MIGRATION}.sql").exists()
@@ -0,0 +1,208 @@
+import asyncio
+import pytest
+import ledger_watcher, outbox, xrpl_utils
+
+class FakeCursor:
+    def __init__(self, log, rowcount):
+        self.log = log
+        self.rowcount = rowcount
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.log.append((sql, params))
+
+class FakeConn:
+    """Records statements; rowcount 0 means another worker holds the lease"""
+
+    def __init__(self, rowcount=1):
+        self.log = []
+        self.rowcount = rowcount
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.log, self.rowcount)
+
+class FakeSigned:
+    def __init__(self, tx_hash, last_ledger_sequence=100):
+        self.tx_hash = tx_hash
+        self.last_ledger_sequence = last_ledger_sequence
+
+    def get_hash(self):
+        return self.tx_hash
+
+class FakeXrpl:
+    """Scripted outcomes, submissions and signatures; records every call"""
+
+    def __init__(self, outcomes=(), submits=(), hashes=("H1", "H2", "H3")):
+        self.outcomes = list(outcomes)
+        self.submits = list(submits)
+        self.hashes = list(hashes)
+        self.signed = []
+        self.submitted = []
+
+    async def get_transaction_outcome_async(self, tx_hash, last_ledger_sequence):
+        return self.outcomes.pop(0)
+
+    async def sign_rlusd_payment_async(self, charity, amount, memo):
+        signed = FakeSigned(self.hashes.pop(0))
+        self.signed.append(signed.tx_hash)
+        return signed
+
+    async def submit_signed_payment_async(self, signed):
+        self.submitted.append(signed if isinstance(signed, str) else signed.tx_hash)
+        result = self.submits.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+class Calls(list):
+    """(function name, args) of every DB call process() makes"""
+    rowcount = 1
+
+@pytest.fixture
+def calls(monkeypatch):
+    log = Calls()
+
+    async def run_db(fn, *args):
+        log.append((fn.__name__, args))
+        return fn(FakeConn(log.rowcount), *args)
+
+    monkeypatch.setattr(outbox, "_run_db", run_db)
+    monkeypatch.setattr(outbox, "MAX_ATTEMPTS", 3)
+    return log
+
+def use(monkeypatch, fake):
+    for name in ("get_transaction_outcome_async", "sign_rlusd_payment_async",
+                 "submit_signed_payment_async"):
+        monkeypatch.setattr(xrpl_utils, name, getattr(fake, name))
+    monkeypatch.setattr(xrpl_utils, "encode_signed", lambda signed: f"blob-{signed.tx_hash}")
+
+def make_job(attempts=1, tx=None, tx_blob=None):
+    return {"id": "job-1", "status": "processing", "charity": "MEDA", "amount": 5,
+            "memo": {"cid": "c1", "chr": "MEDA"}, "extra": {}, "tx": tx, "tx_blob": tx_blob,
+            "last_ledger_sequence": 100 if tx else None, "attempts": attempts, "last_error": None,
+            "locked_until": "lease-1"}
+
+def names(calls):
+    return [name for name, _ in calls]
+
+def reschedule_status(calls):
+    """Status reschedule() wrote, or None if it was not called"""
+    for name, args in calls:
+        if name == "reschedule":
+            conn = FakeConn()
+            outbox.reschedule(conn, *args)
+            return conn.log[0][1][0]
+    return None
+
+def test_new_job_is_signed_recorded_then_finalized(monkeypatch, calls):
+    fake = FakeXrpl(submits=["H1"])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job()))
+    assert names(calls) == ["mark_signed", "finalize"]
+    assert calls[0][1][1:] == ("H1", "blob-H1", 100)
+    assert calls[1][1][1] == "H1"
+
+def test_stale_sequence_re_signs(monkeypatch, calls):
+    fake = FakeXrpl(submits=[xrpl_utils.StaleSequenceError("tefPAST_SEQ"), "H2"])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job()))
+    assert fake.signed == ["H1", "H2"]
+    assert names(calls) == ["mark_signed", "mark_signed", "finalize"]
+    assert calls[-1][1][1] == "H2"
+
+def test_signed_job_already_validated_is_not_resubmitted(monkeypatch, calls):
+    fake = FakeXrpl(outcomes=["tesSUCCESS"])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job(attempts=2, tx="H0", tx_blob="blob-H0")))
+    assert fake.signed == [] and fake.submitted == []
+    assert names(calls) == ["finalize"]
+
+def test_pending_signed_job_resubmits_the_same_blob(monkeypatch, calls):
+    fake = FakeXrpl(outcomes=["pending"], submits=["H0"])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job(attempts=2, tx="H0", tx_blob="blob-H0")))
+    assert fake.signed == [] and fake.submitted == ["blob-H0"]
+    assert names(calls) == ["finalize"]
+
+def test_expired_signed_job_is_re_signed(monkeypatch, calls):
+    fake = FakeXrpl(outcomes=["expired"], submits=["H1"])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job(attempts=2, tx="H0", tx_blob="blob-H0")))
+    assert fake.signed == ["H1"]
+    assert names(calls) == ["mark_signed", "finalize"]
+
+def test_early_failure_is_requeued(monkeypatch, calls):
+    fake = FakeXrpl(submits=[xrpl_utils.PaymentSubmissionError("timeout")])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job(attempts=1)))
+    assert names(calls) == ["mark_signed", "reschedule"]
+    assert reschedule_status(calls) == "queued"
+
+def test_last_attempt_waits_for_pending_payment(monkeypatch, calls):
+    fake = FakeXrpl(outcomes=["pending"], submits=[xrpl_utils.PaymentSubmissionError("timeout")])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job(attempts=3)))
+    assert names(calls) == ["mark_signed", "reschedule"]
+    assert reschedule_status(calls) == "queued"
+
+def test_last_attempt_finalizes_payment_that_validated(monkeypatch, calls):
+    fake = FakeXrpl(outcomes=["tesSUCCESS"], submits=[xrpl_utils.PaymentSubmissionError("timeout")])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job(attempts=3)))
+    assert names(calls) == ["mark_signed", "finalize"]
+
+def test_last_attempt_fails_once_payment_is_final(monkeypatch, calls):
+    fake = FakeXrpl(outcomes=["tecPATH_DRY"], submits=[xrpl_utils.PaymentSubmissionError("tecPATH_DRY")])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job(attempts=3)))
+    assert names(calls) == ["mark_signed", "reschedule"]
+    assert reschedule_status(calls) == "failed"
+
+def test_job_past_max_attempts_only_settles(monkeypatch, calls):
+    fake = FakeXrpl(outcomes=["expired", "expired"])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job(attempts=4, tx="H0", tx_blob="blob-H0")))
+    assert fake.signed == [] and fake.submitted == []
+    assert names(calls) == ["reschedule"]
+    assert reschedule_status(calls) == "failed"
+
+def test_reschedule_defaults_to_attempt_count(monkeypatch):
+    monkeypatch.setattr(outbox, "MAX_ATTEMPTS", 3)
+    conn = FakeConn()
+    assert outbox.reschedule(conn, make_job(attempts=2), "boom") is False
+    assert outbox.reschedule(conn, make_job(attempts=3), "boom") is True
+    assert outbox.reschedule(conn, make_job(attempts=3), "boom", failed=False) is False
+    assert [params[0] for _, params in conn.log] == ["queued", "failed", "queued"]
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(outbox, "BACKOFF_MAX", 10)
+    assert all(0 < outbox.backoff_seconds(n) <= 10 for n in range(1, 20))
+    assert outbox.backoff_seconds(30) >= 5
+
+def test_lost_lease_stops_before_submitting(monkeypatch, calls):
+    calls.rowcount = 0
+    fake = FakeXrpl(submits=["H1"])
+    use(monkeypatch, fake)
+    asyncio.run(outbox.process(make_job()))
+    assert fake.submitted == []
+    assert names(calls) == ["mark_signed"]
+
+def test_writes_are_guarded_by_the_lease():
+    conn = FakeConn(rowcount=0)
+    job = make_job(attempts=3)
+    with pytest.raises(outbox.LeaseLost):
+        outbox.reschedule(conn, job, "boom")
+    outbox.finalize(conn, job, "H1")
+    assert conn.log[1][0].startswith("INSERT INTO donations")
+    for sql, params in conn.log:
+        if sql.startswith("UPDATE"):
+            assert "status = 'processing' AND locked_until = %s" in sql
+            assert params[-2:] == ("job-1", "lease-1")
+
+def test_lease_outlasts_the_validation_waits():
+    assert outbox.LEASE_SECONDS > ledger_watcher.WAIT_TIMEOUT * xrpl_utils.SEQUENCE_RETRIES
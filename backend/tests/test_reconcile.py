@@ -0,0 +1,51 @@
+import json, random
+import reconcile
+from reconcile import ExternalSorter, merge
+
+REAL = [f"A{i:063X}" for i in range(1, 40)]
+
+def test_sorter_merges_runs_in_order_without_duplicates():
+    sorter = ExternalSorter(run_size=4)
+    hashes = REAL * 2    # every payment appears in both accounts' histories
+    random.Random(7).shuffle(hashes)
+    try:
+        for tx_hash in hashes:
+            sorter.add(tx_hash, {"cid": tx_hash[-2:]})
+        assert len(sorter._runs) > 2
+        rows = list(sorter.sorted())
+    finally:
+        sorter.close()
+    assert [tx for tx, _ in rows] == sorted(REAL)
+    assert all(json.loads(memo) == {"cid": tx[-2:]} for tx, memo in rows)
+
+def test_sorter_keeps_transactions_without_memo():
+    sorter = ExternalSorter(run_size=2)
+    sorter.add(REAL[1], None)
+    sorter.add(REAL[0], {"cid": "a"})
+    sorter.add(REAL[2], None)
+    try:
+        assert [(tx, json.loads(memo)) for tx, memo in sorter.sorted()] == [
+            (REAL[0], {"cid": "a"}), (REAL[1], None), (REAL[2], None)
+        ]
+    finally:
+        sorter.close()
+
+def test_merge_classifies_differences():
+    mock = "ab" * 32
+    ledger = [(REAL[0], '{"cid":"a"}'), (REAL[1], "null"), (REAL[2], '{"cid":"c"}'), (REAL[5], "null")]
+    database = [(REAL[1], {"x": 1}), (REAL[2], {"cid": "c"}), (REAL[3], {"x": 3}), (mock, {"x": 4})]
+    assert sorted(list(merge(sorted(ledger), sorted(database, key=lambda r: r[0])))) == sorted([
+        ("missing", REAL[0], {"cid": "a"}),
+        ("extra", REAL[3], {"x": 3}),
+        ("mock", mock, {"x": 4}),
+    ])
+
+def test_merge_of_empty_inputs():
+    assert list(merge([], [])) == []
+    assert list(merge([(REAL[0], "null")], [])) == []
+    assert list(merge([], [(REAL[0], {})])) == [("extra", REAL[0], {})]
+
+def test_is_mock():
+    assert reconcile.is_mock("0f" * 32)
+    assert not reconcile.is_mock("0F" * 32)
+    assert not reconcile.is_mock("0f" * 31)
@@ -0,0 +1,26 @@
+import base64
+import pytest
+from fastapi import HTTPException
+import main
+
+@pytest.mark.parametrize("donor_hash", ["", "abc123", "a" * 64, "dönor/+=?"])
+def test_cursor_round_trip(donor_hash):
+    cursor = main._encode_cursor(donor_hash)
+    assert all(c not in cursor for c in "+/")
+    assert main._decode_cursor(cursor) == donor_hash
+
+def test_missing_cursor_starts_at_the_beginning():
+    assert main._decode_cursor(None) == ""
+    assert main._decode_cursor("") == ""
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(b'["a", "b"]').decode(),
+    base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+    base64.urlsafe_b64encode(b'[1]').decode(),
+])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        main._decode_cursor(cursor)
+    assert exc.value.status_code == 400
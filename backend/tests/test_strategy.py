@@ -0,0 +1,27 @@
+import numpy as np
+import strategy
+
+def rounds(directory):
+    return sorted(int(p.stem[6:]) for p in directory.glob("round_*.npz"))
+
+def test_only_the_newest_rounds_are_kept(tmp_path):
+    for n in range(1, 9):
+        strategy.save_checkpoint(tmp_path, n, [np.full(3, n)], keep=3)
+    assert rounds(tmp_path) == [6, 7, 8]
+    saved_round, arrays = strategy.load_checkpoint(tmp_path/"latest.npz")
+    assert saved_round == 8
+    np.testing.assert_array_equal(arrays[0], np.full(3, 8))
+
+def test_keep_zero_writes_latest_only(tmp_path):
+    strategy.save_checkpoint(tmp_path, 1, [np.zeros(2)], keep=2)
+    strategy.save_checkpoint(tmp_path, 2, [np.ones(2)], keep=0)
+    assert rounds(tmp_path) == []
+    assert strategy.load_checkpoint(tmp_path/"latest.npz")[0] == 2
+
+def test_rounds_past_99999_sort_numerically(tmp_path):
+    for n in (99999, 100000, 100001):
+        strategy.save_checkpoint(tmp_path, n, [np.zeros(1)], keep=2)
+    assert rounds(tmp_path) == [100000, 100001]
+
+def test_missing_checkpoint(tmp_path):
+    assert strategy.load_checkpoint(tmp_path/"latest.npz") == (0, None)
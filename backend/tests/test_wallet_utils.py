@@ -0,0 +1,93 @@
+import asyncio, json, os, stat
+import pytest
+import wallet_utils
+from wallet_utils import RateLimiter
+
+class Clock:
+    """Stands in for time.monotonic; asyncio.sleep advances it instead of waiting"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(wallet_utils.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(wallet_utils.asyncio, "sleep", clock.sleep)
+    return clock
+
+def test_concurrent_acquires_are_spaced(clock):
+    limiter = RateLimiter(4)
+
+    async def burst():
+        await asyncio.gather(*(limiter.acquire() for _ in range(4)))
+
+    asyncio.run(burst())
+    # The first goes at once, the others 1/rate apart
+    assert sorted(clock.sleeps) == [0.25, 0.5, 0.75]
+
+def test_idle_time_is_not_banked(clock):
+    limiter = RateLimiter(2)
+    asyncio.run(limiter.acquire())
+    clock.now += 10
+    asyncio.run(limiter.acquire())
+    asyncio.run(limiter.acquire())
+    assert clock.sleeps == [0.5]
+
+def test_pause_holds_everyone_back(clock):
+    limiter = RateLimiter(10)
+    limiter.pause(3)
+    asyncio.run(limiter.acquire())
+    assert clock.sleeps == [3.0]
+    limiter.pause(0.01)    # never shortens an existing wait
+    asyncio.run(limiter.acquire())
+    assert clock.sleeps[-1] == pytest.approx(3.1)
+
+def test_zero_rate_does_not_limit(clock):
+    limiter = RateLimiter(0)
+    asyncio.run(limiter.acquire())
+    asyncio.run(limiter.acquire())
+    assert clock.sleeps == []
+
+def test_registry_round_trip_is_private(tmp_path):
+    path = tmp_path / "registry.json"
+    assert wallet_utils.load_registry(path) == {}
+    entries = {"CHARITY_1": {"address": "rAddr", "seed": "sSeed", "funded": True}}
+    wallet_utils.save_registry(entries, path)
+    assert wallet_utils.load_registry(path) == entries
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert not (tmp_path / "registry.json.tmp").exists()
+
+def test_retry_delay_honours_retry_after():
+    class Response:
+        headers = {"Retry-After": "7"}
+
+    assert wallet_utils._retry_delay(0, Response()) == 7.0
+    base = wallet_utils.FAUCET_RETRY_BASE
+    assert base * 4 <= wallet_utils._retry_delay(2) <= base * 6
+
+def test_registry_records_the_faucet_used(monkeypatch, tmp_path):
+    path = tmp_path / "registry.json"
+    faucets = []
+
+    async def request_funding(address, limiter, faucet_url):
+        faucets.append(faucet_url)
+
+    async def wait_until_funded(client, address):
+        pass
+
+    monkeypatch.setattr(wallet_utils, "request_funding", request_funding)
+    monkeypatch.setattr(wallet_utils, "wait_until_funded", wait_until_funded)
+    entries = asyncio.run(wallet_utils.provision_charity_wallets_async(
+        ["CHARITY_1"], path, faucet_url="https://faucet.example/accounts"
+    ))
+    assert entries["CHARITY_1"]["funded"]
+    assert faucets == ["https://faucet.example/accounts"]
+    assert json.loads(path.read_text())["faucet"] == "https://faucet.example/accounts"
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+import ledger_watcher, xrpl_utils
+from test_ledger_watcher import signed_payment
+
+class Manager:
+    def __init__(self):
+        self.calls = []
+
+    async def invalidate(self):
+        self.calls.append("invalidate")
+
+    async def release(self, seq):
+        self.calls.append(("release", seq))
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = Manager()
+    monkeypatch.setattr(xrpl_utils, "get_sequence_manager", lambda address: manager)
+    return manager
+
+def outcome(monkeypatch, error=None):
+    async def submit_and_wait_async(signed, client, *args, **kwargs):
+        if error:
+            raise error
+        return {"hash": signed.get_hash(), "meta": {"TransactionResult": "tesSUCCESS"}}
+
+    monkeypatch.setattr(ledger_watcher, "submit_and_wait_async", submit_and_wait_async)
+
+def submit():
+    return asyncio.run(xrpl_utils.submit_signed_payment_async(signed_payment()))
+
+def test_success_returns_the_hash(monkeypatch, manager):
+    outcome(monkeypatch)
+    assert submit() == signed_payment().get_hash()
+    assert manager.calls == []
+
+def test_past_sequence_resyncs_and_asks_for_a_new_signature(monkeypatch, manager):
+    outcome(monkeypatch, ledger_watcher.TransactionRejected("tefPAST_SEQ"))
+    with pytest.raises(xrpl_utils.StaleSequenceError):
+        submit()
+    assert manager.calls == ["invalidate"]
+
+def test_rejection_releases_the_sequence(monkeypatch, manager):
+    outcome(monkeypatch, ledger_watcher.TransactionRejected("telINSUF_FEE_P"))
+    with pytest.raises(xrpl_utils.PaymentSubmissionError) as exc:
+        submit()
+    assert not isinstance(exc.value, xrpl_utils.StaleSequenceError)
+    assert manager.calls == [("release", 5)]
+
+def test_expiry_releases_and_asks_for_a_new_signature(monkeypatch, manager):
+    outcome(monkeypatch, ledger_watcher.TransactionExpired("gone"))
+    with pytest.raises(xrpl_utils.StaleSequenceError):
+        submit()
+    assert manager.calls == [("release", 5)]
+
+def test_timeout_keeps_the_sequence(monkeypatch, manager):
+    outcome(monkeypatch, asyncio.TimeoutError())
+    with pytest.raises(xrpl_utils.PaymentSubmissionError, match="Timed out"):
+        submit()
+    assert manager.calls == []
@@ -0,0 +1,55 @@
+"""
+Per-charity donation totals served from the donation_totals table.
+
+The table is maintained by triggers on donations (see
+sql/migrations/003_donation_totals.sql). Readers share an in-process copy
+that is reused for TOTALS_CACHE_TTL seconds without touching the database,
+and after that only re-read when the table's signature has moved.
+
+The signature is (row count, sum of hwm) rather than max(hwm): hwm values
+are drawn when a trigger fires, not in commit order, so a transaction can
+commit a lower hwm after a higher one is already visible. Every committed
+change still raises a row's hwm, and with it the sum.
+"""
+import os, time, threading
+
+TOTALS_CACHE_TTL = float(os.getenv("TOTALS_CACHE_TTL", "1"))
+
+class TotalsCache:
+    def __init__(self, ttl: float = TOTALS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._signature = None
+        self._totals = {}
+        self._checked_at = 0.0
+
+    def get(self, conn) -> dict:
+        with self._lock:
+            if self._signature is not None and time.monotonic() - self._checked_at < self.ttl:
+                return dict(self._totals)
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*), COALESCE(sum(hwm), 0) FROM donation_totals")
+            signature = tuple(cur.fetchone())
+            if signature != self._signature:
+                # Read rows and signature together so the cache never runs ahead of the data
+                cur.execute("SELECT charity, total, hwm FROM donation_totals")
+                rows = cur.fetchall()
+                signature = (len(rows), sum(row[2] for row in rows))
+                totals = {charity: float(total) for charity, total, _ in rows}
+            else:
+                totals = None
+        with self._lock:
+            if totals is not None:
+                self._totals, self._signature = totals, signature
+            self._checked_at = time.monotonic()
+            return dict(self._totals)
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+CACHE = TotalsCache()
+
+def fetch_totals(conn) -> dict:
+    """{charity: total RLUSD}"""
+    return CACHE.get(conn)
@@ -1,12 +1,29 @@
 """
 RLUSD Trustline utilities for charity wallets
 Enhanced with flexible currency support
+
+provision_trustlines() sets up many wallets at once: existing lines are
+read with AccountLines (following markers) for all accounts concurrently,
+and TrustSet is submitted only for wallets still missing the line, all in
+parallel, so a batch of wallets completes in about one ledger close.
+Re-running it is safe; wallets that already trust the issuer are skipped.
 """
 from xrpl.clients import JsonRpcClient
+from xrpl.asyncio.clients import AsyncJsonRpcClient
 from xrpl.wallet import Wallet
+from xrpl.models.amounts import IssuedCurrencyAmount
+from xrpl.models.requests import AccountLines
 from xrpl.models.transactions import TrustSet
-from xrpl.transaction import submit_and_wait
-import os
+from ledger_watcher import submit_and_wait
+import os, time, asyncio
+import ledger_watcher, wallets
+
+XRPL_RPC = os.getenv("XRPL_RPC", "https://s.altnet.rippletest.net:51234")
+RLUSD_ISSUER = "rQhWct2fv4Vc4KRjRgMrxa8xPN9Zx9iLKV"
+RLUSD_HEX = "524C555344000000000000000000000000000000"
+# Accounts checked or submitted at the same time
+TRUSTLINE_CONCURRENCY = int(os.getenv("TRUSTLINE_CONCURRENCY", "50"))
+ACCOUNT_LINES_PAGE = 400
 
 def text_to_hex(text):
     """Convert text to hex with proper padding"""
@@ -15,6 +32,10 @@ def text_to_hex(text):
     hex_text = text.encode('ascii').hex().upper()
     return hex_text.ljust(40, '0')
 
+def currency_to_hex(currency_code):
+    """Currency field for a TrustSet, using the known RLUSD hex"""
+    return RLUSD_HEX if currency_code == "RLUSD" else text_to_hex(currency_code)
+
 def create_trustline(seed, issuer_address, currency_code, limit_amount="1000000000"):
     """
     Creates a trustline for a specific currency on XRPL testnet
@@ -26,18 +47,14 @@ def create_trustline(seed, issuer_address, currency_code, limit_amount="10000000
     limit_amount: The trust line limit amount (default: 1000000000)
     """
     # Define the network client
-    client = JsonRpcClient(os.getenv("XRPL_RPC", "https://s.altnet.rippletest.net:51234"))
+    client = JsonRpcClient(XRPL_RPC)
     
     # Create wallet from seed
     wallet = Wallet.from_seed(seed)
     
     # Convert currency code to proper hex format
     try:
-        if currency_code == "RLUSD":
-            # Use the known RLUSD hex
-            currency_hex = "524C555344000000000000000000000000000000"
-        else:
-            currency_hex = text_to_hex(currency_code)
+        currency_hex = currency_to_hex(currency_code)
     except ValueError as e:
         print(f"Error: {e}")
         return None, False
@@ -80,7 +97,7 @@ def create_trustline(seed, issuer_address, currency_code, limit_amount="10000000
     
     print("==============================\n")
 
-def create_rlusd_trustline(seed, issuer_address="rQhWct2fv4Vc4KRjRgMrxa8xPN9Zx9iLKV", limit="1000000"):
+def create_rlusd_trustline(seed, issuer_address=RLUSD_ISSUER, limit="1000000"):
     """
     Creates a trustline for RLUSD on a wallet (wrapper for backward compatibility)
     
@@ -91,46 +108,115 @@ def create_rlusd_trustline(seed, issuer_address="rQhWct2fv4Vc4KRjRgMrxa8xPN9Zx9i
     """
     return create_trustline(seed, issuer_address, "RLUSD", limit)
 
-def setup_charity_trustlines():
+async def has_trustline(client, address, issuer_address, currency_code, limit):
     """
-    Sets up RLUSD trustlines for all configured charity wallets
+    Whether address already trusts issuer_address for currency_code up to
+    at least limit. Reads every AccountLines page for that issuer.
     """
-    print("Setting up RLUSD trustlines for charity wallets...\n")
-    
-    charities = {
-        "MEDA": os.getenv("MEDA_WALLET_SEED"),
-        "TARA": os.getenv("TARA_WALLET_SEED")
-    }
-    
-    # Also setup platform wallet if it exists
-    platform_seed = os.getenv("PLATFORM_WALLET_SEED")
-    if platform_seed:
-        charities["PLATFORM"] = platform_seed
-    
-    results = {}
-    
-    for charity_name, seed in charities.items():
-        if not seed:
-            print(f"❌ {charity_name}: No wallet seed configured")
-            results[charity_name] = False
-            continue
-            
-        print(f"Setting up trustline for {charity_name}...")
-        tx_hash, success = create_rlusd_trustline(seed)
-        
-        if success:
-            print(f"✅ {charity_name}: Trustline created successfully")
-            results[charity_name] = True
+    currencies = {currency_code.upper(), currency_to_hex(currency_code)}
+    marker = None
+    while True:
+        response = await client.request(AccountLines(
+            account=address, peer=issuer_address, ledger_index="validated",
+            limit=ACCOUNT_LINES_PAGE, marker=marker
+        ))
+        if not response.is_successful():
+            raise RuntimeError(f"AccountLines failed: {response.result.get('error', response.result)}")
+        for line in response.result.get("lines", []):
+            if line["currency"].upper() in currencies and float(line["limit"]) >= float(limit):
+                return True
+        marker = response.result.get("marker")
+        if marker is None:
+            return False
+
+async def _submit_trustset(client, wallet, trust_set, semaphore):
+    """Submit under the semaphore, then wait for validation outside it"""
+    result = await ledger_watcher.submit_and_wait_async(trust_set, client, wallet, limiter=semaphore)
+    return result["hash"]
+
+async def provision_trustlines_async(named_wallets, issuer_address=RLUSD_ISSUER, currency_code="RLUSD",
+                                     limit="1000000", concurrency=TRUSTLINE_CONCURRENCY):
+    """
+    Ensure every wallet in {name: Wallet} trusts issuer_address for
+    currency_code. Returns {name: (status, detail)} where status is
+    "exists", "created" or "failed" and detail the tx hash or error.
+    """
+    client = AsyncJsonRpcClient(XRPL_RPC)
+    semaphore = asyncio.Semaphore(concurrency)
+    currency_hex = currency_to_hex(currency_code)
+
+    async def check(wallet):
+        async with semaphore:
+            return await has_trustline(client, wallet.classic_address, issuer_address, currency_code, limit)
+
+    checks = await asyncio.gather(*(check(w) for w in named_wallets.values()), return_exceptions=True)
+    results, missing = {}, {}
+    for (name, wallet), found in zip(named_wallets.items(), checks):
+        if isinstance(found, Exception):
+            results[name] = ("failed", f"could not read trustlines: {found}")
+        elif found:
+            results[name] = ("exists", None)
         else:
-            print(f"❌ {charity_name}: Trustline creation failed")
-            results[charity_name] = False
-    
+            missing[name] = wallet
+
+    async def create(wallet):
+        trust_set = TrustSet(
+            account=wallet.classic_address,
+            limit_amount=IssuedCurrencyAmount(currency=currency_hex, issuer=issuer_address, value=str(limit))
+        )
+        return await _submit_trustset(client, wallet, trust_set, semaphore)
+
+    submitted = await asyncio.gather(*(create(w) for w in missing.values()), return_exceptions=True)
+    for name, outcome in zip(missing, submitted):
+        if isinstance(outcome, Exception):
+            results[name] = ("failed", str(outcome) or type(outcome).__name__)
+        else:
+            results[name] = ("created", outcome)
+    return results
+
+def provision_trustlines(named_wallets, issuer_address=RLUSD_ISSUER, currency_code="RLUSD",
+                         limit="1000000", concurrency=TRUSTLINE_CONCURRENCY):
+    """Blocking provision_trustlines_async that also prints a summary"""
+    started = time.monotonic()
+    print(f"Provisioning {currency_code} trustlines for {len(named_wallets)} wallets...\n")
+    results = asyncio.run(provision_trustlines_async(
+        named_wallets, issuer_address, currency_code, limit, concurrency
+    ))
+    print_summary(results, time.monotonic() - started)
+    return results
+
+def print_summary(results, elapsed):
+    icons = {"exists": "✅", "created": "✅", "failed": "❌"}
     print("\n=== Trustline Setup Summary ===")
-    for charity, success in results.items():
-        status = "✅ SUCCESS" if success else "❌ FAILED"
-        print(f"{charity}: {status}")
+    for name, (status, detail) in results.items():
+        print(f"{icons[status]} {name}: {status.upper()}" + (f" ({detail})" if detail else ""))
+    counts = {status: sum(1 for s, _ in results.values() if s == status) for status in icons}
+    print(f"{counts['created']} created, {counts['exists']} already present, "
+          f"{counts['failed']} failed in {elapsed:.1f}s")
     print("===============================\n")
-    
+
+def setup_charity_trustlines(named_wallets=None):
+    """
+    Sets up RLUSD trustlines for all configured charity wallets (and the
+    platform wallet if configured), or for the given {name: Wallet}.
+    Returns {name: success}.
+    """
+    results = {}
+    if named_wallets is None:
+        named_wallets = {}
+        for charity, var in wallets.CHARITY_SEED_VARS.items():
+            wallet = wallets.charity_wallet(charity)
+            if wallet is None:
+                print(f"❌ {charity}: No valid wallet seed configured in {var}")
+                results[charity] = False
+            else:
+                named_wallets[charity] = wallet
+        platform = wallets.platform_wallet()
+        if platform is not None:
+            named_wallets["PLATFORM"] = platform
+
+    provisioned = provision_trustlines(named_wallets)
+    results.update({name: status != "failed" for name, (status, _) in provisioned.items()})
     return results
 
 if __name__ == "__main__":
@@ -1,18 +1,38 @@
 """
 XRPL Wallet utilities for the Eunoia Atlas platform
+
+provision_charity_wallets() creates many charity wallets at once. Keys are
+generated locally and recorded in a JSON registry file (WALLET_REGISTRY)
+before funding, so an interrupted run loses nothing. Funding requests go
+to FAUCET_URL concurrently, paced by FAUCET_RATE and retried with backoff.
+Re-running skips wallets the registry already has as funded.
 """
 from xrpl.clients import JsonRpcClient
+from xrpl.asyncio.clients import AsyncJsonRpcClient
 from xrpl.wallet import generate_faucet_wallet, Wallet
+from xrpl.models.requests import AccountInfo
 from xrpl.models.transactions import Payment
-from xrpl.transaction import submit_and_wait
-import os
+from ledger_watcher import submit_and_wait
+import os, json, time, random, asyncio, argparse, pathlib
+import requests
+
+XRPL_RPC = os.getenv("XRPL_RPC", "https://s.altnet.rippletest.net:51234")
+FAUCET_URL = os.getenv("FAUCET_URL", "https://faucet.altnet.rippletest.net/accounts")
+WALLET_REGISTRY = os.getenv("WALLET_REGISTRY", "wallet_registry.json")
+# Faucet requests per second, funding requests in flight, attempts per wallet
+FAUCET_RATE = float(os.getenv("FAUCET_RATE", "2"))
+FAUCET_CONCURRENCY = int(os.getenv("FAUCET_CONCURRENCY", "10"))
+FAUCET_RETRIES = int(os.getenv("FAUCET_RETRIES", "5"))
+FAUCET_RETRY_BASE = float(os.getenv("FAUCET_RETRY_BASE", "1"))
+# Seconds to wait for a funded account to appear in a validated ledger
+FAUCET_FUND_TIMEOUT = float(os.getenv("FAUCET_FUND_TIMEOUT", "60"))
 
 def create_test_wallet():
     """
     Creates and funds a new test wallet on XRPL testnet
     """
     # Define the network client
-    client = JsonRpcClient(os.getenv("XRPL_RPC", "https://s.altnet.rippletest.net:51234"))
+    client = JsonRpcClient(XRPL_RPC)
     
     # Create a test wallet with test XRP
     test_wallet = generate_faucet_wallet(client)
@@ -38,7 +58,7 @@ def send_rlusd(seed, destination_address, amount, issuer_address="rQhWct2fv4Vc4K
     issuer_address: The address of the RLUSD issuer (defaults to Ripple testnet issuer)
     """
     # Define the network client
-    client = JsonRpcClient(os.getenv("XRPL_RPC", "https://s.altnet.rippletest.net:51234"))
+    client = JsonRpcClient(XRPL_RPC)
     
     # Create wallet from seed
     wallet = Wallet.from_seed(seed)
@@ -102,6 +122,172 @@ def create_charity_wallet(charity_name):
     
     return wallet
 
+class RateLimiter:
+    """Spaces acquisitions at least 1/rate seconds apart across all tasks"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold everyone back, e.g. after the faucet answered 429"""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+def load_registry(path=WALLET_REGISTRY) -> dict:
+    """{name: {"address", "seed", "funded", ...}} from a registry file ({} if absent)"""
+    path = pathlib.Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text()).get("wallets", {})
+
+def save_registry(entries: dict, path=WALLET_REGISTRY, faucet_url=FAUCET_URL):
+    """Atomically rewrite the registry; it holds seeds, so only the owner may read it"""
+    path = pathlib.Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"faucet": faucet_url, "wallets": entries}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def registry_wallets(path=WALLET_REGISTRY, funded_only=True) -> dict:
+    """{name: Wallet} for the wallets in a registry file"""
+    return {name: Wallet.from_seed(entry["seed"]) for name, entry in load_registry(path).items()
+            if entry.get("funded") or not funded_only}
+
+def _retry_delay(attempt: int, response=None) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return FAUCET_RETRY_BASE * 2 ** attempt * (1 + random.random() / 2)
+
+async def request_funding(address: str, limiter: RateLimiter, faucet_url=FAUCET_URL, retries=FAUCET_RETRIES):
+    """Ask the faucet to fund address; retries on 429, 5xx and connection errors"""
+    for attempt in range(retries):
+        await limiter.acquire()
+        response = None
+        try:
+            response = await asyncio.to_thread(
+                requests.post, faucet_url, json={"destination": address}, timeout=30
+            )
+            if response.ok:
+                return
+            if response.status_code != 429 and response.status_code < 500:
+                raise RuntimeError(f"faucet returned {response.status_code}: {response.text[:200]}")
+            error = f"faucet returned {response.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+        delay = _retry_delay(attempt, response)
+        if response is not None and response.status_code == 429:
+            limiter.pause(delay)
+        print(f"Funding {address} failed ({error}); retry {attempt + 1}/{retries} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+    raise RuntimeError(f"faucet gave up after {retries} attempts")
+
+async def wait_until_funded(client, address: str, timeout=FAUCET_FUND_TIMEOUT):
+    """Poll account_info until the account exists in a validated ledger"""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = await client.request(AccountInfo(account=address, ledger_index="validated"))
+        if response.is_successful():
+            return
+        if response.result.get("error") != "actNotFound":
+            raise RuntimeError(f"account_info failed: {response.result.get('error', response.result)}")
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"not funded after {timeout:.0f}s")
+        await asyncio.sleep(1)
+
+async def provision_charity_wallets_async(names, registry=WALLET_REGISTRY, faucet_url=FAUCET_URL,
+                                          rate=FAUCET_RATE, concurrency=FAUCET_CONCURRENCY,
+                                          trustlines=False):
+    """
+    Create and fund a wallet for each charity name, recording each in the
+    registry file. With trustlines=True, RLUSD trustlines are then set up
+    for every funded wallet. Returns the registry entries for `names`.
+    """
+    entries = load_registry(registry)
+    for name in names:
+        if name not in entries:
+            wallet = Wallet.create()
+            entries[name] = {"address": wallet.classic_address, "seed": wallet.seed, "funded": False}
+    save_registry(entries, registry, faucet_url)
+
+    client = AsyncJsonRpcClient(XRPL_RPC)
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fund(name):
+        entry = entries[name]
+        try:
+            async with semaphore:
+                await request_funding(entry["address"], limiter, faucet_url)
+            await wait_until_funded(client, entry["address"])
+        except Exception as e:
+            entry["error"] = str(e)
+            print(f"❌ {name}: {e}")
+            return
+        entry["funded"] = True
+        entry.pop("error", None)
+        save_registry(entries, registry, faucet_url)
+        print(f"✅ {name}: funded {entry['address']}")
+
+    pending = [name for name in names if not entries[name]["funded"]]
+    print(f"Funding {len(pending)} wallets ({len(names) - len(pending)} already funded) via {faucet_url}...")
+    await asyncio.gather(*(fund(name) for name in pending))
+
+    if trustlines:
+        import trustline_utils
+        funded = {name: Wallet.from_seed(entries[name]["seed"]) for name in names if entries[name]["funded"]}
+        results = await trustline_utils.provision_trustlines_async(funded)
+        for name, (status, _) in results.items():
+            entries[name]["trustline"] = status
+        trustline_utils.print_summary(results, 0.0)
+
+    save_registry(entries, registry, faucet_url)
+    return {name: entries[name] for name in names}
+
+def provision_charity_wallets(names, registry=WALLET_REGISTRY, faucet_url=FAUCET_URL,
+                              rate=FAUCET_RATE, concurrency=FAUCET_CONCURRENCY, trustlines=False):
+    started = time.monotonic()
+    results = asyncio.run(provision_charity_wallets_async(
+        names, registry, faucet_url, rate, concurrency, trustlines
+    ))
+    funded = sum(1 for entry in results.values() if entry["funded"])
+    print("\n=== Wallet Provisioning Summary ===")
+    print(f"{funded}/{len(results)} wallets funded in {time.monotonic() - started:.1f}s")
+    print(f"Registry: {registry}")
+    print("===================================\n")
+    return results
+
+def provision_main(argv=None):
+    parser = argparse.ArgumentParser(prog="wallet_utils.py provision",
+                                     description="Create and fund charity wallets in bulk")
+    parser.add_argument("--count", type=int, default=0, help="wallets named <prefix>001 ... <prefix><count>")
+    parser.add_argument("--prefix", default="CHARITY")
+    parser.add_argument("--names", default="", help="comma-separated charity names")
+    parser.add_argument("--registry", default=WALLET_REGISTRY)
+    parser.add_argument("--faucet", default=FAUCET_URL)
+    parser.add_argument("--rate", type=float, default=FAUCET_RATE, help="faucet requests per second")
+    parser.add_argument("--concurrency", type=int, default=FAUCET_CONCURRENCY)
+    parser.add_argument("--trustlines", action="store_true", help="also set up RLUSD trustlines")
+    args = parser.parse_args(argv)
+
+    names = [n.strip().upper() for n in args.names.split(",") if n.strip()]
+    names += [f"{args.prefix.upper()}{i:03d}" for i in range(1, args.count + 1)]
+    if not names:
+        parser.error("give --count or --names")
+    results = provision_charity_wallets(list(dict.fromkeys(names)), args.registry, args.faucet,
+                                        args.rate, args.concurrency, args.trustlines)
+    return 0 if all(entry["funded"] for entry in results.values()) else 1
+
 if __name__ == "__main__":
     import sys
     
@@ -117,6 +303,9 @@ if __name__ == "__main__":
             charity_name = sys.argv[2] if len(sys.argv) > 2 else "TEST"
             create_charity_wallet(charity_name)
             
+        elif command == "provision":
+            sys.exit(provision_main(sys.argv[2:]))
+            
         elif command == "send_rlusd":
             if len(sys.argv) < 5:
                 print("Usage: python wallet_utils.py send_rlusd <seed> <destination> <amount>")
@@ -135,4 +324,6 @@ if __name__ == "__main__":
         print("Available commands:")
         print("  create_wallet - Create a new test wallet")
         print("  create_charity <name> - Create a wallet for a charity")
+        print("  provision --count <n> [--prefix P] [--names A,B] [--registry FILE] [--trustlines]")
+        print("            - Create and fund many charity wallets into a registry file")
         print("  send_rlusd <seed> <destination> <amount> - Send RLUSD")
@@ -0,0 +1,56 @@
+"""
+Process-wide registry of XRPL wallets derived from configured seeds.
+
+Key derivation is CPU work, so each configured seed is turned into a Wallet
+once and kept in memory. Call reload() after changing the seed environment
+variables to drop the cached keys and derive them again on next use.
+"""
+import os, threading
+from xrpl.wallet import Wallet
+
+CHARITY_SEED_VARS = {
+    "MEDA": "MEDA_WALLET_SEED",
+    "TARA": "TARA_WALLET_SEED",
+}
+PLATFORM_SEED_VAR = "PLATFORM_WALLET_SEED"
+
+_lock = threading.Lock()
+_wallets = {}   # env var -> (seed, Wallet or None)
+
+def _from_env(var: str):
+    seed = os.getenv(var)
+    with _lock:
+        cached = _wallets.get(var)
+        if cached is not None and cached[0] == seed:
+            return cached[1]
+        wallet = None
+        if seed:
+            try:
+                wallet = Wallet.from_seed(seed)
+            except Exception as e:
+                print(f"Warning: Could not initialize wallet from {var}: {e}")
+        # Failures are cached too, so a bad seed is reported once, not per donation
+        _wallets[var] = (seed, wallet)
+        return wallet
+
+def platform_wallet():
+    """Dedicated platform sender wallet, or None if not configured"""
+    return _from_env(PLATFORM_SEED_VAR)
+
+def charity_wallet(charity: str):
+    var = CHARITY_SEED_VARS.get(charity.upper())
+    return _from_env(var) if var else None
+
+def charity_wallets() -> dict:
+    """{charity: Wallet} for every charity whose seed is configured and valid"""
+    wallets = {}
+    for charity in CHARITY_SEED_VARS:
+        wallet = charity_wallet(charity)
+        if wallet is not None:
+            wallets[charity] = wallet
+    return wallets
+
+def reload():
+    """Forget all derived keys; they are re-derived from the environment on next use"""
+    with _lock:
+        _wallets.clear()
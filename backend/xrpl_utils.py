@@ -1,23 +1,18 @@
-import os, json, xrpl, psycopg2, jsonschema, pathlib
-from datetime import datetime, timezone
-from hashlib import sha256
+import os, asyncio, xrpl
+import xrpl.asyncio.clients, xrpl.asyncio.ledger, xrpl.asyncio.transaction
 import secrets
-
-SCHEMA = json.load(open(pathlib.Path(__file__).parent/"edms_schema.json"))
-
-def get_db():
-    return psycopg2.connect(os.getenv("POSTGRES_URL"))
+import batch_writer
+import db
+import edms
+import ledger_watcher
+import wallets
 
 CLIENT = xrpl.clients.JsonRpcClient(os.getenv("XRPL_RPC"))
+ASYNC_CLIENT = xrpl.asyncio.clients.AsyncJsonRpcClient(os.getenv("XRPL_RPC"))
 
 def get_wallets():
-    try:
-        meda_wallet = xrpl.wallet.Wallet.from_seed(os.getenv("MEDA_WALLET_SEED"))
-        tara_wallet = xrpl.wallet.Wallet.from_seed(os.getenv("TARA_WALLET_SEED"))
-        return {"MEDA": meda_wallet, "TARA": tara_wallet}
-    except Exception as e:
-        print(f"Warning: Could not initialize wallets: {e}")
-        return {}
+    """Charity wallets from the process-wide registry (derived once)"""
+    return wallets.charity_wallets()
 
 def get_charity_destinations():
     """Get charity destination wallet addresses"""
@@ -26,145 +21,142 @@ def get_charity_destinations():
         "TARA": os.getenv("TARA_WALLET_ADDRESS", "rJXhFfZVLKBUfNQMZqssdqG3xj5JZFdqYm")
     }
 
-def _hash(blob: dict) -> str:
-    return sha256(json.dumps(blob, sort_keys=True).encode()).hexdigest()
+RLUSD_CURRENCY = "524C555344000000000000000000000000000000"  # RLUSD hex
+RLUSD_ISSUER = "rQhWct2fv4Vc4KRjRgMrxa8xPN9Zx9iLKV"  # Ripple testnet issuer
 
-def send_rlusd_payment(charity: str, cid: str, amount: float):
-    """
-    Send real RLUSD payment to charity wallet
-    """
-    wallets = get_wallets()
+def _get_sender_wallet():
+    """Platform wallet if configured, otherwise the first charity wallet"""
+    # Use dedicated platform wallet if available, otherwise use first charity wallet
+    platform = wallets.platform_wallet()
+    if platform:
+        return platform
+
+    # Fallback to first available charity wallet
+    for charity in wallets.CHARITY_SEED_VARS:
+        wallet = wallets.charity_wallet(charity)
+        if wallet:
+            return wallet
+
+    raise ValueError("No sender wallet available")
+
+def build_memo(charity: str, cid: str, amount: float) -> dict:
+    """Validated EDMS memo fields (see edms.build)"""
+    return edms.build(charity, cid, amount).fields
+
+def _build_payment(sender_wallet, destination_address: str, amount: float, memo: edms.EncodedMemo):
+    # Create payment transaction using approach from your scripts with send_max
+    rlusd_amount = {
+        "currency": RLUSD_CURRENCY,
+        "value": str(amount),
+        "issuer": RLUSD_ISSUER
+    }
+
+    return xrpl.models.transactions.Payment(
+        account=sender_wallet.classic_address,
+        destination=destination_address,
+        amount=rlusd_amount,
+        send_max=rlusd_amount,  # Required for RLUSD conversions
+        memos=[xrpl.models.transactions.Memo(
+            memo_data=memo.hex
+        )]
+    )
+
+def _mock_tx_hash(reason: str) -> str:
+    # Fallback to mock transaction for demo
+    mock_tx_hash = secrets.token_hex(32)
+    print(f"Using mock transaction{reason}: {mock_tx_hash}")
+    return mock_tx_hash
+
+def _prepare_platform_payment(charity: str, cid: str, amount: float):
     destinations = get_charity_destinations()
-    
     if charity not in destinations:
         raise ValueError(f"Invalid charity: {charity}")
-    
-    # Use dedicated platform wallet if available, otherwise use first charity wallet
-    platform_seed = os.getenv("PLATFORM_WALLET_SEED")
-    if platform_seed:
-        try:
-            sender_wallet = xrpl.wallet.Wallet.from_seed(platform_seed)
-        except Exception as e:
-            print(f"Warning: Could not initialize platform wallet: {e}")
-            sender_wallet = None
-    else:
-        sender_wallet = None
-    
-    # Fallback to first available charity wallet
-    if not sender_wallet:
-        for wallet_charity, wallet in wallets.items():
-            sender_wallet = wallet
-            break
-    
-    if not sender_wallet:
-        raise ValueError("No sender wallet available")
-    
+
+    sender_wallet = _get_sender_wallet()
     destination_address = destinations[charity]
-    
-    memo = {
-        "cid": cid,
-        "chr": charity,
-        "amt": amount,
-        "cur": "RLUSD",
-        "ts": datetime.now(timezone.utc).isoformat(timespec="seconds")
-    }
-    memo["ph"] = _hash(memo)
-    
-    # Validate memo against schema
-    jsonschema.validate(memo, SCHEMA)
+    return sender_wallet, destination_address, edms.build(charity, cid, amount)
+
+def _prepare_seed_payment(seed: str, charity: str, cid: str, amount: float):
+    destinations = get_charity_destinations()
+    if charity not in destinations:
+        raise ValueError(f"Invalid charity: {charity}")
 
     try:
-        # Create payment transaction using approach from your scripts with send_max
-        rlusd_amount = {
-            "currency": "524C555344000000000000000000000000000000",  # RLUSD hex
-            "value": str(amount),
-            "issuer": "rQhWct2fv4Vc4KRjRgMrxa8xPN9Zx9iLKV"  # Ripple testnet issuer
-        }
-        
-        payment_tx = xrpl.models.transactions.Payment(
-            account=sender_wallet.classic_address,
-            destination=destination_address,
-            amount=rlusd_amount,
-            send_max=rlusd_amount,  # Required for RLUSD conversions
-            memos=[xrpl.models.transactions.Memo(
-                memo_data=xrpl.utils.str_to_hex(json.dumps(memo))
-            )]
-        )
-        
+        sender_wallet = xrpl.wallet.Wallet.from_seed(seed)
+    except Exception as e:
+        raise ValueError(f"Invalid sender seed: {e}")
+
+    return sender_wallet, destinations[charity], edms.build(charity, cid, amount)
+
+def _log_platform_payment(tx_hash, sender_wallet, destination_address, charity, amount, memo_json):
+    print(f"Real XRPL transaction successful: {tx_hash}")
+    print(f"Sender: {sender_wallet.classic_address}")
+    print(f"Destination: {destination_address}")
+    print(f"Amount: {amount} RLUSD to {charity}")
+    print(f"Memo: {memo_json}")
+
+def send_rlusd_payment(charity: str, cid: str, amount: float):
+    """
+    Send real RLUSD payment to charity wallet
+    """
+    sender_wallet, destination_address, encoded = _prepare_platform_payment(charity, cid, amount)
+    memo = encoded.fields
+
+    try:
+        payment_tx = _build_payment(sender_wallet, destination_address, amount, encoded)
+
         # Submit and wait for validation (like your scripts)
-        response = xrpl.transaction.submit_and_wait(
+        response = ledger_watcher.submit_and_wait(
             payment_tx, CLIENT, sender_wallet
         )
-        
+
         if response.is_successful():
             tx_hash = response.result["hash"]
-            print(f"Real XRPL transaction successful: {tx_hash}")
-            print(f"Sender: {sender_wallet.classic_address}")
-            print(f"Destination: {destination_address}")
-            print(f"Amount: {amount} RLUSD to {charity}")
-            print(f"Memo: {json.dumps(memo)}")
+            _log_platform_payment(tx_hash, sender_wallet, destination_address, charity, amount, encoded.json)
             return tx_hash, memo
         else:
             print(f"Transaction failed: {response.result}")
-            # Fallback to mock transaction for demo
-            mock_tx_hash = secrets.token_hex(32)
-            print(f"Using mock transaction: {mock_tx_hash}")
-            return mock_tx_hash, memo
-            
+            return _mock_tx_hash(""), memo
+
     except Exception as e:
         print(f"Error in real XRPL transaction: {e}")
-        # Fallback to mock transaction
-        mock_tx_hash = secrets.token_hex(32)
-        print(f"Using mock transaction due to error: {mock_tx_hash}")
-        return mock_tx_hash, memo
+        return _mock_tx_hash(" due to error"), memo
 
-def send_rlusd_payment_from_seed(seed: str, charity: str, cid: str, amount: float):
+async def send_rlusd_payment_async(charity: str, cid: str, amount: float):
     """
-    Send RLUSD payment using an explicitly provided wallet seed as the sender.
-    Intended for demo/server-signed flows where the platform temporarily
-    custodians a specific user's seed.
+    Non-blocking variant of send_rlusd_payment for async request handlers.
+    Waiting for ledger validation yields to the event loop, so many donations
+    can be in flight on one worker.
     """
-    destinations = get_charity_destinations()
-    if charity not in destinations:
-        raise ValueError(f"Invalid charity: {charity}")
+    sender_wallet, destination_address, encoded = _prepare_platform_payment(charity, cid, amount)
+    memo = encoded.fields
 
     try:
-        sender_wallet = xrpl.wallet.Wallet.from_seed(seed)
-    except Exception as e:
-        raise ValueError(f"Invalid sender seed: {e}")
-
-    destination_address = destinations[charity]
+        payment_tx = _build_payment(sender_wallet, destination_address, amount, encoded)
+        tx_hash = await submit_pipelined_async(payment_tx, sender_wallet)
+        _log_platform_payment(tx_hash, sender_wallet, destination_address, charity, amount, encoded.json)
+        return tx_hash, memo
 
-    memo = {
-        "cid": cid,
-        "chr": charity,
-        "amt": amount,
-        "cur": "RLUSD",
-        "ts": datetime.now(timezone.utc).isoformat(timespec="seconds")
-    }
-    memo["ph"] = _hash(memo)
+    except PaymentSubmissionError as e:
+        print(f"Transaction failed: {e}")
+        return _mock_tx_hash(""), memo
+    except Exception as e:
+        print(f"Error in real XRPL transaction: {e}")
+        return _mock_tx_hash(" due to error"), memo
 
-    # Validate memo against schema
-    jsonschema.validate(memo, SCHEMA)
+def send_rlusd_payment_from_seed(seed: str, charity: str, cid: str, amount: float):
+    """
+    Send RLUSD payment using an explicitly provided wallet seed as the sender.
+    Intended for demo/server-signed flows where the platform temporarily
+    custodians a specific user's seed.
+    """
+    sender_wallet, destination_address, encoded = _prepare_seed_payment(seed, charity, cid, amount)
+    memo = encoded.fields
 
     try:
-        rlusd_amount = {
-            "currency": "524C555344000000000000000000000000000000",
-            "value": str(amount),
-            "issuer": "rQhWct2fv4Vc4KRjRgMrxa8xPN9Zx9iLKV"
-        }
-
-        payment_tx = xrpl.models.transactions.Payment(
-            account=sender_wallet.classic_address,
-            destination=destination_address,
-            amount=rlusd_amount,
-            send_max=rlusd_amount,
-            memos=[xrpl.models.transactions.Memo(
-                memo_data=xrpl.utils.str_to_hex(json.dumps(memo))
-            )]
-        )
+        payment_tx = _build_payment(sender_wallet, destination_address, amount, encoded)
 
-        response = xrpl.transaction.submit_and_wait(
+        response = ledger_watcher.submit_and_wait(
             payment_tx, CLIENT, sender_wallet
         )
 
@@ -174,29 +166,225 @@ def send_rlusd_payment_from_seed(seed: str, charity: str, cid: str, amount: floa
             return tx_hash, memo
         else:
             print(f"Transaction failed: {response.result}")
-            mock_tx_hash = secrets.token_hex(32)
-            print(f"Using mock transaction: {mock_tx_hash}")
-            return mock_tx_hash, memo
+            return _mock_tx_hash(""), memo
 
     except Exception as e:
         print(f"Error in XRPL transaction from seed: {e}")
-        mock_tx_hash = secrets.token_hex(32)
-        print(f"Using mock transaction due to error: {mock_tx_hash}")
-        return mock_tx_hash, memo
+        return _mock_tx_hash(" due to error"), memo
+
+async def send_rlusd_payment_from_seed_async(seed: str, charity: str, cid: str, amount: float):
+    """
+    Non-blocking variant of send_rlusd_payment_from_seed for async request handlers.
+    """
+    sender_wallet, destination_address, encoded = _prepare_seed_payment(seed, charity, cid, amount)
+    memo = encoded.fields
+
+    try:
+        payment_tx = _build_payment(sender_wallet, destination_address, amount, encoded)
+        tx_hash = await submit_pipelined_async(payment_tx, sender_wallet)
+        print(f"XRPL transaction successful (user->charity): {tx_hash}")
+        return tx_hash, memo
+
+    except PaymentSubmissionError as e:
+        print(f"Transaction failed: {e}")
+        return _mock_tx_hash(""), memo
+
+    except Exception as e:
+        print(f"Error in XRPL transaction from seed: {e}")
+        return _mock_tx_hash(" due to error"), memo
+
+class PaymentSubmissionError(Exception):
+    """Raised when a payment did not succeed on ledger; never falls back to a mock hash"""
+
+class StaleSequenceError(PaymentSubmissionError):
+    """The transaction's Sequence was already used; re-sign with a fresh one"""
+
+# Each statement row-locks the account's counter, so processes allocating
+# for the same account at once get distinct numbers
+_TAKE_SEQUENCE = """
+UPDATE xrpl_sequences SET next_sequence = next_sequence + 1
+WHERE address = %s AND next_sequence IS NOT NULL
+RETURNING next_sequence - 1
+"""
+# Start from account_info unless another process synced the counter meanwhile
+_SEED_SEQUENCE = """
+INSERT INTO xrpl_sequences AS s (address, next_sequence) VALUES (%(address)s, %(seq)s + 1)
+ON CONFLICT (address) DO UPDATE SET next_sequence = COALESCE(s.next_sequence, %(seq)s) + 1
+RETURNING next_sequence - 1
+"""
+_RESET_SEQUENCE = """
+UPDATE xrpl_sequences SET next_sequence = NULL
+WHERE address = %s AND (%s::bigint IS NULL OR next_sequence > %s::bigint)
+"""
+
+def _take_sequence(conn, address):
+    with conn.cursor() as cur:
+        cur.execute(_TAKE_SEQUENCE, (address,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+def _seed_sequence(conn, address, seq):
+    with conn.cursor() as cur:
+        cur.execute(_SEED_SEQUENCE, {"address": address, "seq": seq})
+        return cur.fetchone()[0]
+
+def _reset_sequence(conn, address, below=None):
+    with conn.cursor() as cur:
+        cur.execute(_RESET_SEQUENCE, (address, below, below))
+
+class SequenceManager:
+    """
+    Hands out Sequence numbers for one sending account without asking the
+    ledger each time, so many signed payments can be submitted within the
+    same ledger instead of one autofill round-trip (and one ledger close)
+    per payment.
+
+    The counter lives in the xrpl_sequences table, so the API and all
+    outbox worker processes signing for the same account share it. It is
+    dropped and re-read from account_info whenever the ledger disagrees with
+    it: a tefPAST_SEQ, or a submission that failed without consuming its
+    Sequence and so leaves a gap behind it.
+    """
+
+    def __init__(self, address: str, client=None):
+        self.address = address
+        self.client = client or ASYNC_CLIENT
+
+    async def _fetch_next(self) -> int:
+        response = await self.client.request(xrpl.models.requests.AccountInfo(
+            account=self.address, ledger_index="current", queue=True
+        ))
+        if not response.is_successful():
+            raise PaymentSubmissionError(f"account_info failed for {self.address}: {response.result}")
+        seq = response.result["account_data"]["Sequence"]
+        # Transactions sitting in the server's queue already own their sequences
+        highest_queued = response.result.get("queue_data", {}).get("highest_sequence")
+        if highest_queued is not None:
+            seq = max(seq, highest_queued + 1)
+        return seq
+
+    async def allocate(self) -> int:
+        pool = db.get_async_pool()
+        seq = await pool.run(_take_sequence, self.address)
+        if seq is None:
+            seq = await pool.run(_seed_sequence, self.address, await self._fetch_next())
+            print(f"Sequence for {self.address} synced at {seq}")
+        return seq
+
+    async def invalidate(self):
+        """Resync from account_info on the next allocation"""
+        await db.get_async_pool().run(_reset_sequence, self.address)
+
+    async def release(self, seq: int):
+        """A sequence was handed out but will never be consumed on ledger"""
+        await db.get_async_pool().run(_reset_sequence, self.address, seq)
+
+_SEQUENCE_MANAGERS = {}
+
+def get_sequence_manager(address: str) -> SequenceManager:
+    if address not in _SEQUENCE_MANAGERS:
+        _SEQUENCE_MANAGERS[address] = SequenceManager(address)
+    return _SEQUENCE_MANAGERS[address]
+
+async def sign_with_sequence_async(transaction, wallet):
+    """Sign `transaction` using a locally allocated Sequence"""
+    manager = get_sequence_manager(wallet.classic_address)
+    seq = await manager.allocate()
+    tx = type(transaction).from_dict({**transaction.to_dict(), "sequence": seq})
+    try:
+        return await xrpl.asyncio.transaction.autofill_and_sign(tx, ASYNC_CLIENT, wallet)
+    except Exception:
+        await manager.release(seq)
+        raise
+
+async def sign_rlusd_payment_async(charity: str, amount: float, memo: dict):
+    """Autofill and sign a platform payment for an already-built memo"""
+    destinations = get_charity_destinations()
+    if charity not in destinations:
+        raise ValueError(f"Invalid charity: {charity}")
+
+    sender_wallet = _get_sender_wallet()
+    payment_tx = _build_payment(sender_wallet, destinations[charity], amount, edms.encode(memo))
+    return await sign_with_sequence_async(payment_tx, sender_wallet)
+
+def encode_signed(signed_tx) -> str:
+    return xrpl.core.binarycodec.encode(signed_tx.to_xrpl())
+
+async def submit_signed_payment_async(signed_tx) -> str:
+    """
+    Submit a signed transaction (or its blob) and wait for validation.
+    Returns the hash; raises PaymentSubmissionError on any failure and
+    StaleSequenceError when the transaction must be re-signed.
+    """
+    if isinstance(signed_tx, str):
+        signed_tx = xrpl.models.transactions.transaction.Transaction.from_blob(signed_tx)
+    manager = get_sequence_manager(signed_tx.account)
+    tx_hash = signed_tx.get_hash()
+    try:
+        await ledger_watcher.submit_and_wait_async(signed_tx, ASYNC_CLIENT)
+    except ledger_watcher.TransactionRejected as e:
+        if e.engine_result == "tefPAST_SEQ":
+            await manager.invalidate()
+            raise StaleSequenceError(f"Sequence {signed_tx.sequence} already used by {signed_tx.account}") from e
+        # Rejected outright; its sequence is free again, leaving a gap behind it
+        await manager.release(signed_tx.sequence)
+        raise PaymentSubmissionError(str(e)) from e
+    except ledger_watcher.TransactionExpired as e:
+        # Never made it into a validated ledger (e.g. stuck behind a gap)
+        await manager.release(signed_tx.sequence)
+        raise StaleSequenceError(str(e)) from e
+    except asyncio.TimeoutError as e:
+        raise PaymentSubmissionError(f"Timed out waiting for {tx_hash}") from e
+    except Exception as e:
+        raise PaymentSubmissionError(str(e)) from e
+    return tx_hash
+
+SEQUENCE_RETRIES = int(os.getenv("XRPL_SEQUENCE_RETRIES", "3"))
+
+async def submit_pipelined_async(transaction, wallet, retries: int = SEQUENCE_RETRIES) -> str:
+    """
+    Sign with a locally allocated Sequence, submit without waiting for the
+    previous payment from the same account, and wait for validation.
+    """
+    for attempt in range(retries):
+        signed_tx = await sign_with_sequence_async(transaction, wallet)
+        try:
+            return await submit_signed_payment_async(signed_tx)
+        except StaleSequenceError as e:
+            print(f"Resubmitting with a fresh sequence ({attempt + 1}/{retries}): {e}")
+    raise PaymentSubmissionError(f"Gave up after {retries} sequence conflicts")
+
+async def get_transaction_outcome_async(tx_hash: str, last_ledger_sequence: int | None) -> str:
+    """
+    Final TransactionResult of a submitted transaction, "pending" if it may
+    still validate, or "expired" once its LastLedgerSequence has passed.
+    """
+    response = await ASYNC_CLIENT.request(xrpl.models.requests.Tx(transaction=tx_hash))
+    result = response.result
+    if response.is_successful() and result.get("validated"):
+        return result["meta"]["TransactionResult"]
+    if not response.is_successful() and result.get("error") != "txnNotFound":
+        raise PaymentSubmissionError(f"Could not look up {tx_hash}: {result}")
+    if last_ledger_sequence is not None:
+        validated = await xrpl.asyncio.ledger.get_latest_validated_ledger_sequence(ASYNC_CLIENT)
+        if validated > last_ledger_sequence:
+            return "expired"
+    return "pending"
 
 def save_record(record: dict):
+    """Write a donation record through the group-commit writer; returns once committed"""
+    try:
+        batch_writer.get_writer().write(record)
+        print(f"Successfully saved record: {record['tx']}")
+    except Exception as e:
+        print(f"Error saving record: {e}")
+        raise
+
+async def save_record_async(record: dict):
+    """save_record without blocking the event loop"""
     try:
-        conn = get_db()
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO donations (tx, data) VALUES (%s, %s) ON CONFLICT DO NOTHING",
-                (record["tx"], json.dumps(record))
-            )
-            conn.commit()
-            print(f"Successfully saved record: {record['tx']}")
-        conn.close()
+        await batch_writer.get_writer().write_async(record)
+        print(f"Successfully saved record: {record['tx']}")
     except Exception as e:
         print(f"Error saving record: {e}")
-        if 'conn' in locals():
-            conn.close()
-        raise 
\ No newline at end of file
+        raise